@@ -19,7 +19,6 @@ from utils.storage import StorageHandler
 import base64
 from core.chat import Chat
 import json
-import uuid
 import logging
 
 # Configure logging
@@ -56,9 +55,12 @@ def handle_exception(e):
     # Return a JSON response with the error details
     return jsonify(error_response), 500
 
+# Reports the frontend's history view reads from the assessment list
+HISTORY_REPORT_TYPES = ('threat_model', 'dread_assessment', 'mitigation', 'attack_tree')
+
 # Initialize handlers
 storage_handler = StorageHandler()
-openai_handler = OpenAIHandler()
+openai_handler = OpenAIHandler.get_default()
 threat_modeling_handler = ThreatModelingHandler(openai_handler)
 
 # Global chat instance to maintain conversation history across requests
@@ -198,11 +200,12 @@ def upload_documents():
     persist_dir = ""
     documents = []
     
-    # Determine persist directory based on Confluence space or random name
+    # Determine persist directory based on Confluence space, or a shared one otherwise; the
+    # vector databases inside are keyed by content, so uploads of the same documents reuse them
     if session['name']:
         persist_dir = os.path.join(app.config['UPLOAD_FOLDER'], f"persist_{session['name']}")
     else:
-        persist_dir = os.path.join(app.config['UPLOAD_FOLDER'], f"persist_{uuid.uuid4()}")
+        persist_dir = os.path.join(app.config['UPLOAD_FOLDER'], "persist_shared")
     
     # Ensure the persist directory exists
     os.makedirs(persist_dir, exist_ok=True)
@@ -279,7 +282,7 @@ def upload_documents():
         return jsonify({"error": f"Error processing documents: {str(e)}"}), 500
 
     # Initialize OpenAI handler
-    openai_handler = OpenAIHandler()  # Use the OpenAIHandler instance directly
+    openai_handler = OpenAIHandler.get_default()
     
     # Process RAG
     rag_handler = RAGHandler(openai_handler=openai_handler, persist_dir=persist_dir, assessment_id=assessment_id)
@@ -352,7 +355,7 @@ def query_ai():
             return jsonify({"error": "Assessment ID is required"}), 400
 
         # Initialize OpenAI handler
-        openai_handler = OpenAIHandler()
+        openai_handler = OpenAIHandler.get_default()
         
         # Use the chat instance from a global variable if it exists, otherwise create a new one
         global chat_instance
@@ -526,8 +529,7 @@ def generate_threat_model():
         prompts_data = storage_handler.get_prompts(assessment_id) or {"prompts": {}}
         
         # Store the threat model prompt
-        prompts_data["prompts"]["threat_model"] = threat_model_prompt
-        storage_handler.save_prompts(assessment_id, prompts_data["prompts"])
+        storage_handler.save_prompts(assessment_id, {**prompts_data["prompts"], "threat_model": threat_model_prompt})
         
         # Return in the format expected by the frontend
         return jsonify({
@@ -559,7 +561,7 @@ def generate_dread_assessment():
             return jsonify({"error": "Threat model not found"}), 404
             
         # Initialize OpenAI handler
-        openai_handler = OpenAIHandler()
+        openai_handler = OpenAIHandler.get_default()
         
         # Generate DREAD assessment
         dread_handler = DreadHandler(openai_handler)
@@ -582,8 +584,7 @@ def generate_dread_assessment():
         prompts_data = storage_handler.get_prompts(assessment_id) or {"prompts": {}}
         
         # Store the DREAD assessment prompt
-        prompts_data["prompts"]["dread"] = dread_prompt
-        storage_handler.save_prompts(assessment_id, prompts_data["prompts"])
+        storage_handler.save_prompts(assessment_id, {**prompts_data["prompts"], "dread": dread_prompt})
         
         # Store DREAD results
         storage_handler.save_dread_assessment(assessment_id, dread_result)
@@ -618,7 +619,7 @@ def generate_mitigations():
             return jsonify({"error": "Threat model not found"}), 404
             
         # Initialize OpenAI handler
-        openai_handler = OpenAIHandler()
+        openai_handler = OpenAIHandler.get_default()
         
         # Generate mitigations
         mitigation_handler = MitigationHandler(openai_handler)
@@ -643,8 +644,7 @@ def generate_mitigations():
         prompts_data = storage_handler.get_prompts(assessment_id) or {"prompts": {}}
         
         # Store the mitigations prompt
-        prompts_data["prompts"]["mitigation"] = mitigation_prompt
-        storage_handler.save_prompts(assessment_id, prompts_data["prompts"])
+        storage_handler.save_prompts(assessment_id, {**prompts_data["prompts"], "mitigation": mitigation_prompt})
         
         # Store mitigation results
         storage_handler.save_mitigation_result(assessment_id, result)
@@ -675,7 +675,7 @@ def generate_attack_tree():
             return jsonify({"error": "Threat model not found"}), 404
             
         # Initialize OpenAI handler
-        openai_handler = OpenAIHandler()
+        openai_handler = OpenAIHandler.get_default()
         
         # Generate attack tree
         attack_tree_handler = AttackTreeHandler(openai_handler)
@@ -690,8 +690,7 @@ def generate_attack_tree():
         prompts_data = storage_handler.get_prompts(assessment_id) or {"prompts": {}}
         
         # Store the attack tree prompt
-        prompts_data["prompts"]["attack_tree"] = attack_tree_prompt
-        storage_handler.save_prompts(assessment_id, prompts_data["prompts"])
+        storage_handler.save_prompts(assessment_id, {**prompts_data["prompts"], "attack_tree": attack_tree_prompt})
         
         # Ensure the result has the expected structure for the frontend
         if "attack_tree" not in result:
@@ -741,7 +740,7 @@ def generate_test_cases():
         mitigation_data = storage_handler.get_mitigation_result(assessment_id)
         
         # Initialize OpenAI handler
-        openai_handler = OpenAIHandler()
+        openai_handler = OpenAIHandler.get_default()
         
         # Generate test cases based on threat model and mitigations
         prompt = f"""
@@ -990,7 +989,15 @@ def access_storage():
         
         # If no assessment_id is provided, return list of all assessments
         if not assessment_id:
-            assessments = storage_handler.retrive_from_storage()
+            # The history view renders these reports straight from the list; summary=true
+            # lists names and available reports only, with bodies fetched one at a time
+            summary = request.args.get('summary', '').lower() in ('1', 'true')
+            # Optional limit returns only the most recent assessments
+            limit = request.args.get('limit', type=int)
+            assessments = storage_handler.retrive_from_storage(
+                include_bodies=False if summary else HISTORY_REPORT_TYPES,
+                limit=limit
+            )
             
             # For each assessment, try to read and include details.json
             for assessment in assessments:
@@ -1053,29 +1060,16 @@ def download_combined_json():
             with open(details_path, 'r') as f:
                 combined_data["Info"] = json.load(f)
         
-        # Load threat_model.json
-        threat_model_path = os.path.join('storage', assessment_id, 'threat_model.json')
-        if os.path.exists(threat_model_path):
-            with open(threat_model_path, 'r') as f:
-                combined_data["threatmodel"] = json.load(f)
-        
-        # Load attack_tree.json
-        attack_tree_path = os.path.join('storage', assessment_id, 'attack_tree.json')
-        if os.path.exists(attack_tree_path):
-            with open(attack_tree_path, 'r') as f:
-                combined_data["attacktree"] = json.load(f)
-        
-        # Load dread_assessment.json
-        dread_path = os.path.join('storage', assessment_id, 'dread_assessment.json')
-        if os.path.exists(dread_path):
-            with open(dread_path, 'r') as f:
-                combined_data["dread"] = json.load(f)
-        
-        # Load mitigation.json
-        mitigation_path = os.path.join('storage', assessment_id, 'mitigation.json')
-        if os.path.exists(mitigation_path):
-            with open(mitigation_path, 'r') as f:
-                combined_data["mitigations"] = json.load(f)
+        # Load the reports through the storage handler, which reads compressed reports too
+        for key, report_name in (
+            ("threatmodel", "threat_model"),
+            ("attacktree", "attack_tree"),
+            ("dread", "dread_assessment"),
+            ("mitigations", "mitigation")
+        ):
+            report = storage_handler.get(assessment_id, report_name)
+            if report is not None:
+                combined_data[key] = report
         
         # Return as downloadable JSON file
         response = Response(
@@ -1,7 +1,8 @@
 import json
 import logging
-import os
+import re
 from rag.rag_handler import PromptManager
+from utils.storage import load_details
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -17,25 +18,24 @@ class AttackTreeHandler:
         Get the methodology from details.json for the given assessment_id.
         Raises an error if details.json doesn't exist or doesn't contain the methodology.
         """
-        details_path = os.path.join('storage', assessment_id, 'details.json')
-        if not os.path.exists(details_path):
+        # Parsed details are cached until details.json changes on disk
+        try:
+            details = load_details(assessment_id)
+        except FileNotFoundError:
             error_msg = f"details.json not found for assessment {assessment_id}"
             logging.error(error_msg)
             raise ValueError(error_msg)
-            
-        try:
-            with open(details_path, 'r') as f:
-                details = json.load(f)
-                methodology = details.get('threatModelingMethodology')
-                if not methodology:
-                    error_msg = f"No threat modeling methodology found in details.json for assessment {assessment_id}"
-                    logging.error(error_msg)
-                    raise ValueError(error_msg)
-                return methodology
         except Exception as e:
             error_msg = f"Error reading methodology from details.json: {str(e)}"
             logging.error(error_msg)
             raise ValueError(error_msg)
+            
+        methodology = details.get('threatModelingMethodology')
+        if not methodology:
+            error_msg = f"No threat modeling methodology found in details.json for assessment {assessment_id}"
+            logging.error(error_msg)
+            raise ValueError(error_msg)
+        return methodology
     
     def create_attack_tree_prompt(self, threat_model_result, assessment_id=None):
         """
@@ -86,7 +86,7 @@ class AttackTreeHandler:
 {prompt_data.system_context} {prompt_data.task}
 
 The JSON structure should follow this format:
-{json.dumps(prompt_data.format.get("example", {}), indent=2)}
+{prompt_data.example_json}
 
 {prompt_data.instructions}
 
@@ -246,9 +246,6 @@ Use commas between all properties and array elements.
                     # If parsing fails, try fixing the JSON
                     logging.warning("Initial JSON parsing failed, attempting fixes")
                     
-                    # Fix missing commas between properties
-                    import re
-                    
                     # Fix missing commas between properties at the same level
                     fixed_content = re.sub(r'"\s*\n\s*"', '",\n"', fixed_content)
                     fixed_content = re.sub(r'}\s*\n\s*{', '},\n{', fixed_content)
@@ -1,11 +1,59 @@
+import functools
 import json
 import logging
-import os
+import re
+from typing import List
+from pydantic import BaseModel, ConfigDict, Field
+from llm.rate_limiter import rate_limiter
 from rag.rag_handler import PromptManager
+from utils.storage import load_details
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Single-line // comments, which are not valid JSON
+_COMMENT_RE = re.compile(r"//[^\n]*")
+
+# DREAD score columns, in table order
+DREAD_COLUMNS = ("Damage Potential", "Reproducibility", "Exploitability", "Affected Users", "Discoverability")
+
+# Routing key for OpenAI prompt caching; bump when the prompt layout changes
+PROMPT_CACHE_KEY = "dread_v1"
+
+class ThreatRiskScore(BaseModel):
+    """A single threat scored against the DREAD categories."""
+    model_config = ConfigDict(extra="forbid", populate_by_name=True)
+
+    threat_type: str = Field(alias="Threat Type")
+    scenario: str = Field(alias="Scenario")
+    damage_potential: int = Field(alias="Damage Potential")
+    reproducibility: int = Field(alias="Reproducibility")
+    exploitability: int = Field(alias="Exploitability")
+    affected_users: int = Field(alias="Affected Users")
+    discoverability: int = Field(alias="Discoverability")
+
+class RiskAssessment(BaseModel):
+    """Schema of the DREAD assessment returned by the LLM."""
+    model_config = ConfigDict(extra="forbid", populate_by_name=True)
+
+    risk_assessment: List[ThreatRiskScore] = Field(alias="Risk Assessment")
+
+# Structured Outputs response format for OpenAI; strict mode guarantees schema-valid JSON
+RISK_ASSESSMENT_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "risk_assessment",
+        "strict": True,
+        "schema": RiskAssessment.model_json_schema(by_alias=True)
+    }
+}
+
+@functools.lru_cache(maxsize=1)
+def _example_json():
+    """The DREAD example response, serialized compactly once per process."""
+    example = PromptManager().get_prompt("dread_assessment").format.get("example", {})
+    return json.dumps(example, separators=(",", ":"))
+
 class DreadHandler:
     def __init__(self, openai_handler):
         self.openai_handler = openai_handler
@@ -62,23 +110,25 @@ Your entire response must be parseable as JSON. Do not include any explanatory t
 The JSON must include the key "Risk Assessment" with an array of threat assessments exactly as shown.
 """
         
+        # Static instructions come first so providers with prefix caching can reuse them;
+        # the per-assessment threats and attack tree go last
         prompt = f"""
 {json_instructions}
 {prompt_data.system_context}
 {prompt_data.task}
 
-Below is the list of identified threats:
-
-{formatted_threats}
-
-{attack_tree_context}
-
 {prompt_data.instructions}
 
 Example of expected JSON response format:
-{json.dumps(prompt_data.format.get("example", {}), indent=2)}
+{_example_json()}
 
 Ensure the JSON response is correctly formatted and does not contain any additional text.
+
+Below is the list of identified threats:
+
+{formatted_threats}
+
+{attack_tree_context}
 """
         return prompt
 
@@ -110,9 +160,9 @@ Ensure the JSON response is correctly formatted and does not contain any additio
         text = text.replace(",}", "}")
         text = text.replace(",]", "]")
         
-        # Remove any comments (which are not valid JSON)
-        import re
-        text = re.sub(r'//.*?\n', '\n', text)  # Remove single-line comments
+        # Remove any comments (which are not valid JSON); most responses have none
+        if "//" in text:
+            text = _COMMENT_RE.sub("", text)
         
         logging.debug(f"Cleaned JSON text: {text[:100]}..." if len(text) > 100 else f"Cleaned JSON text: {text}")
         return text
@@ -145,7 +195,9 @@ Ensure the JSON response is correctly formatted and does not contain any additio
             
             # Add provider-specific parameters
             if method == 'OPENAI':
-                params["response_format"] = {"type": "json_object"}
+                params["response_format"] = RISK_ASSESSMENT_RESPONSE_FORMAT
+                # Route repeat requests to the same cache so the shared prefix is billed once
+                params["extra_body"] = {"prompt_cache_key": PROMPT_CACHE_KEY}
                 logging.info("Using OpenAI-specific parameters")
             elif method == 'BEDROCK':
                 # Bedrock might not support response_format, so we don't add it
@@ -153,13 +205,19 @@ Ensure the JSON response is correctly formatted and does not contain any additio
             
             # Make the API call
             logging.info(f"Sending request to {method} with model {self.openai_handler.model}")
-            response = self.client.chat.completions.create(**params)
+            response = rate_limiter.create_chat_completion(self.client, **params)
             
             # Extract and parse the response content
             response_text = response.choices[0].message.content
             logging.info(f"Response content length: {len(response_text)}")
             logging.debug(f"Response content preview: {response_text[:200]}...")
             
+            # Structured Outputs already guarantee valid JSON, so skip the cleanup heuristics
+            if method == 'OPENAI':
+                assessment = RiskAssessment.model_validate_json(response_text)
+                logging.info("Successfully parsed structured JSON response")
+                return assessment.model_dump(by_alias=True)
+            
             # Clean the response text to handle potential formatting issues
             cleaned_text = self.clean_json_response(response_text)
             
@@ -203,54 +261,52 @@ Ensure the JSON response is correctly formatted and does not contain any additio
         Get the methodology from details.json for the given assessment_id.
         Raises an error if details.json doesn't exist or doesn't contain the methodology.
         """
-        details_path = os.path.join('storage', assessment_id, 'details.json')
-        if not os.path.exists(details_path):
+        # Parsed details are cached until details.json changes on disk
+        try:
+            details = load_details(assessment_id)
+        except FileNotFoundError:
             error_msg = f"details.json not found for assessment {assessment_id}"
             logging.error(error_msg)
             raise ValueError(error_msg)
-            
-        try:
-            with open(details_path, 'r') as f:
-                details = json.load(f)
-                methodology = details.get('threatModelingMethodology')
-                if not methodology:
-                    error_msg = f"No threat modeling methodology found in details.json for assessment {assessment_id}"
-                    logging.error(error_msg)
-                    raise ValueError(error_msg)
-                return methodology
         except Exception as e:
             error_msg = f"Error reading methodology from details.json: {str(e)}"
             logging.error(error_msg)
             raise ValueError(error_msg)
+            
+        methodology = details.get('threatModelingMethodology')
+        if not methodology:
+            error_msg = f"No threat modeling methodology found in details.json for assessment {assessment_id}"
+            logging.error(error_msg)
+            raise ValueError(error_msg)
+        return methodology
     
     def json_to_markdown(self, dread_assessment, assessment_id=None):
         """
         Convert JSON DREAD assessment to Markdown for display.
         """
-        markdown_output = "\n\n## DREAD Risk Assessment\n\n"
-        
-        markdown_output += "| Threat Type | Scenario | Damage Potential | Reproducibility | Exploitability | Affected Users | Discoverability | Risk Score |\n"
-        markdown_output += "|-------------|----------|------------------|-----------------|----------------|----------------|-----------------|-------------|\n"
-        
+        rows = [
+            "\n\n## DREAD Risk Assessment\n\n",
+            "| Threat Type | Scenario | Damage Potential | Reproducibility | Exploitability | Affected Users | Discoverability | Risk Score |\n",
+            "|-------------|----------|------------------|-----------------|----------------|----------------|-----------------|-------------|\n"
+        ]
+
         try:
             threats = dread_assessment.get("Risk Assessment", [])
             for threat in threats:
                 if isinstance(threat, dict):
-                    damage_potential = threat.get('Damage Potential', 0)
-                    reproducibility = threat.get('Reproducibility', 0)
-                    exploitability = threat.get('Exploitability', 0)
-                    affected_users = threat.get('Affected Users', 0)
-                    discoverability = threat.get('Discoverability', 0)
-                    
+                    # Missing or null scores count as 0, matching the LLM fallback payload
+                    scores = [threat.get(col) or 0 for col in DREAD_COLUMNS]
+
                     # Calculate the Risk Score
-                    risk_score = (damage_potential + reproducibility + exploitability + affected_users + discoverability) / 5
-                    
-                    markdown_output += f"| {threat.get('Threat Type', 'N/A')} | {threat.get('Scenario', 'N/A')} | {damage_potential} | {reproducibility} | {exploitability} | {affected_users} | {discoverability} | {risk_score:.2f} |\n"
+                    risk_score = sum(scores) / len(DREAD_COLUMNS)
+
+                    cells = " | ".join(str(score) for score in scores)
+                    rows.append(f"| {threat.get('Threat Type', 'N/A')} | {threat.get('Scenario', 'N/A')} | {cells} | {risk_score:.2f} |\n")
         except Exception as e:
             logging.error(f"Error converting DREAD assessment to markdown: {str(e)}")
-            markdown_output += f"| Error | Failed to format DREAD assessment: {str(e)} | - | - | - | - | - | - |\n"
-        
-        return markdown_output
+            rows.append(f"| Error | Failed to format DREAD assessment: {str(e)} | - | - | - | - | - | - |\n")
+
+        return "".join(rows)
 
     def generate_dread_assessment(self, threat_model_result, attack_tree_data=None, assessment_id=None):
         """
@@ -258,6 +314,13 @@ Ensure the JSON response is correctly formatted and does not contain any additio
         """
         logging.info("Generating DREAD assessment")
         
+        # Nothing to score, so skip the LLM round-trip entirely
+        if not threat_model_result.get('threat_model'):
+            logging.info("No threats to assess, returning an empty DREAD assessment")
+            return {
+                "raw_response": {"Risk Assessment": []}
+            }
+        
         # Create the prompt using threat model results and attack tree data
         prompt = self.create_dread_assessment_prompt(threat_model_result, attack_tree_data, assessment_id)
         
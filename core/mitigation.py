@@ -1,11 +1,16 @@
 import json
 import logging
-import os
+import re
+from llm.rate_limiter import rate_limiter
 from rag.rag_handler import PromptManager
+from utils.storage import load_details
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Single-line // comments, which are not valid JSON
+_COMMENT_RE = re.compile(r"//[^\n]*")
+
 class MitigationHandler:
     def __init__(self, openai_handler):
         self.openai_handler = openai_handler
@@ -17,25 +22,24 @@ class MitigationHandler:
         Get the methodology from details.json for the given assessment_id.
         Raises an error if details.json doesn't exist or doesn't contain the methodology.
         """
-        details_path = os.path.join('storage', assessment_id, 'details.json')
-        if not os.path.exists(details_path):
+        # Parsed details are cached until details.json changes on disk
+        try:
+            details = load_details(assessment_id)
+        except FileNotFoundError:
             error_msg = f"details.json not found for assessment {assessment_id}"
             logging.error(error_msg)
             raise ValueError(error_msg)
-            
-        try:
-            with open(details_path, 'r') as f:
-                details = json.load(f)
-                methodology = details.get('threatModelingMethodology')
-                if not methodology:
-                    error_msg = f"No threat modeling methodology found in details.json for assessment {assessment_id}"
-                    logging.error(error_msg)
-                    raise ValueError(error_msg)
-                return methodology
         except Exception as e:
             error_msg = f"Error reading methodology from details.json: {str(e)}"
             logging.error(error_msg)
             raise ValueError(error_msg)
+            
+        methodology = details.get('threatModelingMethodology')
+        if not methodology:
+            error_msg = f"No threat modeling methodology found in details.json for assessment {assessment_id}"
+            logging.error(error_msg)
+            raise ValueError(error_msg)
+        return methodology
     
     def create_mitigations_prompt(self, threat_model_result, attack_tree_data=None, dread_data=None, assessment_id=None):
         """
@@ -131,9 +135,9 @@ YOUR RESPONSE (do not wrap in a code block):
         text = text.replace(",}", "}")
         text = text.replace(",]", "]")
         
-        # Remove any comments (which are not valid JSON)
-        import re
-        text = re.sub(r'//.*?\n', '\n', text)  # Remove single-line comments
+        # Remove any comments (which are not valid JSON); most responses have none
+        if "//" in text:
+            text = _COMMENT_RE.sub("", text)
         
         logging.debug(f"Cleaned JSON text: {text[:100]}..." if len(text) > 100 else f"Cleaned JSON text: {text}")
         return text
@@ -174,7 +178,7 @@ YOUR RESPONSE (do not wrap in a code block):
             
             # Make the API call
             logging.info(f"Sending request to {method} with model {self.openai_handler.model}")
-            response = self.client.chat.completions.create(**params)
+            response = rate_limiter.create_chat_completion(self.client, **params)
             
             # Extract and parse the response content
             response_text = response.choices[0].message.content
@@ -196,13 +200,14 @@ YOUR RESPONSE (do not wrap in a code block):
         """
         logging.info("Generating mitigations")
         
-        # Determine which methodology to use from details.json if assessment_id is provided
-        methodology = None
-        if assessment_id:
-            methodology = self._get_methodology_from_details(assessment_id)
-            logging.info(f"Using threat modeling methodology from details.json for mitigations processing: {methodology}")
+        # Nothing to mitigate, so skip the LLM round-trip entirely
+        if not threat_model_result.get('threat_model'):
+            logging.info("No threats to mitigate, returning empty mitigations")
+            return {
+                "raw_response": {"mitigations": []}
+            }
         
-        # Create the prompt using all available data
+        # Create the prompt using all available data (this also resolves the methodology)
         prompt = self.create_mitigations_prompt(threat_model_result, attack_tree_data, dread_data, assessment_id)
         
         # Get the mitigations
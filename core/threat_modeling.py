@@ -1,36 +1,193 @@
-import json
+import asyncio
+import functools
+import hashlib
 import logging
-import os
+import re
+from typing import List
+import orjson
+from pydantic import BaseModel, ConfigDict, Field
 from llm.openai_module import OpenAIHandler
+from llm.response_cache import SemanticThreatModelCache, ThreatModelCache
 from rag.rag_handler import PromptManager
+from utils.config import get_semantic_cache_threshold, get_threat_model_cache_ttl
+from utils.storage import load_details
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+log = logging.getLogger(__name__)
+
+# Markdown code fences, single-line comments and trailing commas, all invalid in JSON
+_CLEAN_RE = re.compile(r"```json|```|//[^\n]*|,(?=\s*[}\]])")
+
+# Threat fields as (canonical name, alternative name some models use, default)
+_THREAT_FIELD_ALIASES = (
+    ("Threat Type", "type", "Unknown"),
+    ("Scenario", "description", "No scenario provided"),
+    ("Potential Impact", "impact", "Impact not specified"),
+)
+
+class Threat(BaseModel):
+    """A single identified threat."""
+    model_config = ConfigDict(extra="forbid", populate_by_name=True)
+
+    threat_type: str = Field(alias="Threat Type")
+    scenario: str = Field(alias="Scenario")
+    potential_impact: str = Field(alias="Potential Impact")
+
+class ThreatModelResponse(BaseModel):
+    """Schema of the threat model returned by the LLM."""
+    model_config = ConfigDict(extra="forbid")
+
+    threat_model: List[Threat]
+    improvement_suggestions: List[str]
+
+# Structured Outputs response format for OpenAI; the schema replaces the inline JSON example
+THREAT_MODEL_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "threat_model",
+        "strict": True,
+        "schema": ThreatModelResponse.model_json_schema(by_alias=True)
+    }
+}
+
+class IncrementalJsonScanner:
+    """
+    Tracks brace depth and string/escape state across chunks of text, so the end
+    of the first top-level JSON object is known as soon as it arrives.
+    Brackets inside strings are ignored, and a balanced {...} that doesn't parse as
+    a JSON object (e.g. braces in leading prose) is skipped rather than taken.
+    """
+
+    def __init__(self):
+        self.start = -1  # offset of the opening brace, -1 until seen
+        self.end = -1    # offset of the matching closing brace, -1 until seen
+        self._chunks = []
+        self._offset = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def complete(self):
+        return self.end >= 0
+
+    def _is_object(self, end):
+        text = "".join(self._chunks)
+        self._chunks = [text]
+        try:
+            return isinstance(orjson.loads(text[self.start:end+1]), dict)
+        except orjson.JSONDecodeError:
+            return False
+
+    def feed(self, chunk):
+        """Scan the next chunk of text; returns True once the first JSON object is closed."""
+        if self.complete:
+            return True
+        self._chunks.append(chunk)
+        for i, char in enumerate(chunk, self._offset):
+            if self.start < 0:
+                # The expected payload is an object, so only a brace can open it
+                if char == '{':
+                    self.start = i
+                    self._depth = 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    if self._is_object(i):
+                        self.end = i
+                        return True
+                    # Not JSON after all; keep looking after it
+                    self.start = -1
+        self._offset += len(chunk)
+        return False
+
+def _extract_first_json_object(text):
+    """Return the first balanced JSON object in `text`, or None if there is none."""
+    scanner = IncrementalJsonScanner()
+    if scanner.feed(text):
+        return text[scanner.start:scanner.end+1]
+    return None
+
+@functools.lru_cache(maxsize=4)
+def _cached_prompt_prefix(method, include_example=True):
+    """
+    Build the stable part of the threat model prompt for the given LLM method:
+    template instructions plus, unless the response format already enforces a
+    schema, the serialized JSON example.
+    """
+    prompt_data = PromptManager().get_prompt("threat_model")
+    
+    # Add stronger JSON formatting instructions for Bedrock
+    json_instructions = ""
+    if method == 'BEDROCK':
+        json_instructions = """
+IMPORTANT: You MUST respond with valid, properly formatted JSON that follows the exact structure shown in the example below.
+Your entire response must be parseable as JSON. Do not include any explanatory text outside the JSON structure.
+The JSON must include the keys "threat_model" and "improvement_suggestions" exactly as shown.
+"""
+    
+    prefix = f"""
+{json_instructions}
+{prompt_data.system_context} {prompt_data.task}
+
+{prompt_data.instructions}
+"""
+    if include_example:
+        prefix += f"""
+Example of expected JSON response format:
+{prompt_data.example_json}
+"""
+    return prefix
 
 class ThreatModelingHandler:
-    def __init__(self, openai_handler):
-        self.openai_handler = openai_handler
-        self.client = openai_handler.client
+    def __init__(self, openai_handler=None, response_cache=None):
+        self.openai_handler = openai_handler or OpenAIHandler.get_default()
+        self.client = self.openai_handler.client
         self.last_generated_prompt = None  # Store the last generated prompt
         self.prompt_manager = PromptManager()
+        # Identical prompts reuse the stored response instead of calling the LLM again;
+        # opt-in, since a regenerate with the same inputs would otherwise return the same model
+        if response_cache is None:
+            cache_ttl = get_threat_model_cache_ttl()
+            response_cache = ThreatModelCache(ttl=cache_ttl) if cache_ttl > 0 else None
+        self.response_cache = response_cache
+        # Near-duplicate requests can reuse an earlier response; opt-in since the match is approximate
+        similarity_threshold = get_semantic_cache_threshold()
+        self.semantic_cache = SemanticThreatModelCache(self.client, similarity_threshold) if similarity_threshold > 0 else None
 
-    def create_threat_model_prompt(self, app_type, authentication, internet_facing, sensitive_data, app_input, custom_prompt="", org_context="", assessment_id=None):
+    def create_threat_model_prompt_parts(self, app_type, authentication, internet_facing, sensitive_data, app_input, custom_prompt="", org_context="", assessment_id=None):
         """
-        Create a prompt for generating a threat model using the selected methodology.
+        Create the threat model prompt as a (stable_prefix, dynamic_suffix) pair.
+        The prefix depends only on the prompt template and LLM method, so it is
+        byte-identical across requests and can be served from provider prefix caches;
+        everything specific to the assessment goes in the suffix.
         """
         # Ensure custom_prompt is a string
         if custom_prompt is None:
             custom_prompt = ""
         
         # Log the custom prompt for debugging
-        logging.info(f"Custom prompt received in create_threat_model_prompt: '{custom_prompt[:100]}...'")
+        log.info("Custom prompt received in create_threat_model_prompt: '%.100s...'", custom_prompt)
         
         # Get methodology from details.json if assessment_id is provided
         methodology = None
         if assessment_id:
             try:
                 methodology = self._get_methodology_from_details(assessment_id)
-                logging.info(f"Using threat modeling methodology from details.json: {methodology}")
+                log.info("Using threat modeling methodology from details.json: %s", methodology)
             except ValueError as e:
                 # Re-raise the error to be handled by the caller
                 raise ValueError(f"Failed to get methodology: {str(e)}")
@@ -38,31 +195,19 @@ class ThreatModelingHandler:
             # If no assessment_id is provided, this is likely a direct call not through the API
             # In this case, we need to throw an error as we can't determine the methodology
             error_msg = "Assessment ID is required to determine the threat modeling methodology"
-            logging.error(error_msg)
+            log.error(error_msg)
             raise ValueError(error_msg)
         
-        # Get the threat model prompt template
-        prompt_data = self.prompt_manager.get_prompt("threat_model")
-        
-        # Add stronger JSON formatting instructions for Bedrock
-        json_instructions = ""
-        if self.openai_handler.method == 'BEDROCK':
-            json_instructions = """
-IMPORTANT: You MUST respond with valid, properly formatted JSON that follows the exact structure shown in the example below.
-Your entire response must be parseable as JSON. Do not include any explanatory text outside the JSON structure.
-The JSON must include the keys "threat_model" and "improvement_suggestions" exactly as shown.
-"""
+        # The template and example never change at runtime, so the prefix is built once per method
+        stable_prefix = _cached_prompt_prefix(
+            self.openai_handler.method,
+            include_example=not self.openai_handler.supports_structured_outputs
+        )
         
-        # Store the prompt being generated
-        self.last_generated_prompt = f"""
-{json_instructions}
-{prompt_data.system_context} {prompt_data.task}
-
+        dynamic_suffix = f"""
 ORGANIZATION SECURITY CONTEXT:
 {org_context}
 
-{prompt_data.instructions}
-
 APPLICATION TYPE: {app_type}
 AUTHENTICATION METHODS: {authentication}
 INTERNET FACING: {internet_facing}
@@ -72,45 +217,40 @@ CODE SUMMARY, README CONTENT, AND APPLICATION DESCRIPTION:
 
 ADDITIONAL CONTEXT AND REQUIREMENTS:
 {custom_prompt}
-
-Example of expected JSON response format:
-{json.dumps(prompt_data.format.get("example", {}), indent=2)}
 """
+        # Store the prompt being generated
+        self.last_generated_prompt = stable_prefix + dynamic_suffix
+        return stable_prefix, dynamic_suffix
+
+    def create_threat_model_prompt(self, app_type, authentication, internet_facing, sensitive_data, app_input, custom_prompt="", org_context="", assessment_id=None):
+        """
+        Create a prompt for generating a threat model using the selected methodology.
+        """
+        self.create_threat_model_prompt_parts(
+            app_type, authentication, internet_facing, sensitive_data, app_input, custom_prompt, org_context, assessment_id
+        )
         return self.last_generated_prompt
 
     def clean_json_response(self, text):
         """
         Clean the response text to handle potential JSON formatting issues.
         """
-        # Remove any markdown code block indicators
-        text = text.replace("```json", "").replace("```", "")
+        # Strip code fences, // comments and trailing commas before closing brackets in one pass
+        text = _CLEAN_RE.sub("", text).strip()
         
-        # Trim whitespace
-        text = text.strip()
-        
-        # If the text starts with a non-JSON character, try to find the start of the JSON
-        if text and text[0] not in ['{', '[']:
-            # Look for the first occurrence of '{'
+        # Keep only the first balanced JSON object, dropping any surrounding prose
+        json_object = _extract_first_json_object(text)
+        if json_object is not None:
+            text = json_object
+        else:
+            # Nothing parses as an object on its own; take everything from the first '{'
+            # to the last '}' and let the parser report what's wrong
             json_start = text.find('{')
-            if json_start >= 0:
-                text = text[json_start:]
-        
-        # If the text ends with a non-JSON character, try to find the end of the JSON
-        if text and text[-1] not in ['}', ']']:
-            # Look for the last occurrence of '}'
             json_end = text.rfind('}')
-            if json_end >= 0:
-                text = text[:json_end+1]
-        
-        # Remove any trailing commas before closing brackets (common JSON parsing error)
-        text = text.replace(",}", "}")
-        text = text.replace(",]", "]")
-        
-        # Remove any comments (which are not valid JSON)
-        import re
-        text = re.sub(r'//.*?\n', '\n', text)  # Remove single-line comments
+            if json_start >= 0:
+                text = text[json_start:json_end+1] if json_end > json_start else text[json_start:]
         
-        logging.debug(f"Cleaned JSON text: {text[:100]}..." if len(text) > 100 else f"Cleaned JSON text: {text}")
+        log.debug("Cleaned JSON text: %.100s", text)
         return text
         
     def _get_methodology_from_details(self, assessment_id):
@@ -118,56 +258,53 @@ Example of expected JSON response format:
         Get the methodology from details.json for the given assessment_id.
         Raises an error if details.json doesn't exist or doesn't contain the methodology.
         """
-        details_path = os.path.join('storage', assessment_id, 'details.json')
-        if not os.path.exists(details_path):
+        # Parsed details are cached until details.json changes on disk
+        try:
+            details = load_details(assessment_id)
+        except FileNotFoundError:
             error_msg = f"details.json not found for assessment {assessment_id}"
-            logging.error(error_msg)
+            log.error(error_msg)
             raise ValueError(error_msg)
-            
-        try:
-            with open(details_path, 'r') as f:
-                details = json.load(f)
-                methodology = details.get('threatModelingMethodology')
-                if not methodology:
-                    error_msg = f"No threat modeling methodology found in details.json for assessment {assessment_id}"
-                    logging.error(error_msg)
-                    raise ValueError(error_msg)
-                return methodology
         except Exception as e:
             error_msg = f"Error reading methodology from details.json: {str(e)}"
-            logging.error(error_msg)
+            log.error(error_msg)
+            raise ValueError(error_msg)
+            
+        methodology = details.get('threatModelingMethodology')
+        if not methodology:
+            error_msg = f"No threat modeling methodology found in details.json for assessment {assessment_id}"
+            log.error(error_msg)
             raise ValueError(error_msg)
+        return methodology
     
     def json_to_markdown(self, threat_model, improvement_suggestions, assessment_id=None):
         """
         Convert JSON threat model to Markdown for display.
         """
-        markdown_output = "\n\n"
-        
         # STRIDE format
-        markdown_output += "| Threat Type | Scenario | Potential Impact |\n"
-        markdown_output += "|-------------|----------|------------------|\n"
+        parts = [
+            "\n\n",
+            "| Threat Type | Scenario | Potential Impact |\n",
+            "|-------------|----------|------------------|\n"
+        ]
         
         # Fill the table rows with the STRIDE threat model data
         for threat in threat_model:
-            markdown_output += f"| {threat['Threat Type']} | {threat['Scenario']} | {threat['Potential Impact']} |\n"
+            parts.append(f"| {threat['Threat Type']} | {threat['Scenario']} | {threat['Potential Impact']} |\n")
         
-        markdown_output += "\n\n## Improvement Suggestions\n\n"
+        parts.append("\n\n## Improvement Suggestions\n\n")
         for suggestion in improvement_suggestions:
-            markdown_output += f"- {suggestion}\n"
+            parts.append(f"- {suggestion}\n")
         
-        return markdown_output
+        return "".join(parts)
 
-    def get_threat_model(self, prompt):
+    def _prepare_threat_model_request(self, prompt, prompt_prefix=""):
         """
-        Get threat model from the LLM response.
+        Build the chat completion parameters for a threat model request, plus the
+        response cache key (None when the cache is disabled).
         """
-        method = self.openai_handler.method
-        logging.info(f"Generating threat model using {method}")
-        
-        try:
-            # Prepare system message with strict JSON formatting instructions
-            system_message = """You are a security expert generating threat models in JSON format.
+        # Prepare system message with strict JSON formatting instructions
+        system_message = """You are a security expert generating threat models in JSON format.
 Your response MUST be a valid JSON object with exactly these fields:
 1. "threat_model": An array of threat objects, each containing:
    - "Threat Type": The STRIDE category (e.g., "Spoofing", "Tampering", etc.)
@@ -189,68 +326,179 @@ Example of valid response format:
     "Add response data encryption for sensitive fields"
   ]
 }"""
+        if prompt_prefix:
+            system_message = f"{system_message}\n{prompt_prefix}"
+
+        # Prepare common parameters
+        params = {
+            "model": self.openai_handler.model,
+            "messages": [
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": prompt}
+            ],
+            "max_tokens": 8000
+        }
+        if self.openai_handler.supports_streaming:
+            # Stream so the response is scanned while it is generated
+            params["stream"] = True
+        
+        # Add provider-specific parameters
+        params.update(self.openai_handler.json_mode_params)
+        if self.openai_handler.supports_structured_outputs:
+            params["response_format"] = THREAT_MODEL_RESPONSE_FORMAT
+        if self.openai_handler.supports_prompt_cache_key:
+            # Route requests sharing this prefix to the same cache
+            prefix_hash = hashlib.blake2b(system_message.encode("utf-8"), digest_size=8).hexdigest()
+            params["extra_body"] = {"prompt_cache_key": f"threat_model_{prefix_hash}"}
+        log.info("Using %s-specific parameters", self.openai_handler.method)
+        
+        cache_key = None
+        if self.response_cache:
+            cache_key = ThreatModelCache.make_key(self.openai_handler.model, system_message, prompt)
+        return params, cache_key
 
-            # Prepare common parameters
-            params = {
-                "model": self.openai_handler.model,
-                "messages": [
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": prompt}
-                ],
-                "max_tokens": 8000
-            }
+    def _parse_threat_model_text(self, response_text, cache_key=None):
+        """
+        Clean, parse and normalize the raw LLM response text, storing the result in
+        the response cache when a cache key is given.
+        """
+        log.info("Response content length: %s", len(response_text))
+        log.debug("Response content preview: %.200s...", response_text)
+        
+        try:
+            # JSON mode output is usually valid as-is; parse it directly before paying for cleanup
+            response_content = orjson.loads(response_text)
+            log.info("Successfully parsed JSON response")
+        except orjson.JSONDecodeError:
+            # Clean the response text
+            cleaned_text = self.clean_json_response(response_text)
+            try:
+                response_content = orjson.loads(cleaned_text)
+                log.info("Successfully parsed cleaned JSON response")
+            except orjson.JSONDecodeError as je:
+                log.error("Failed to parse JSON response: %s", je)
+                log.error("Response was: %s", response_text)
+                raise ValueError(f"Invalid JSON response from {self.openai_handler.method}: {str(je)}")
+        
+        # Validate and normalize the response structure
+        normalized_response = self._normalize_threat_model_response(response_content)
+        log.info("Successfully normalized threat model response")
+        
+        if cache_key:
+            self.response_cache.set(cache_key, normalized_response)
+        
+        return normalized_response
+
+    def _threat_model_error_response(self, error):
+        """Placeholder threat model returned when generation fails."""
+        method = self.openai_handler.method
+        log.error("Error generating threat model with %s: %s", method, error)
+        return {
+            "threat_model": [
+                {
+                    "Threat Type": "Error",
+                    "Scenario": f"Failed to generate threat model with {method}: {str(error)}",
+                    "Potential Impact": "Unable to assess security threats"
+                }
+            ],
+            "improvement_suggestions": [
+                "Try again with a more detailed application description",
+                "Check API key and connection",
+                f"Verify {method} configuration and model compatibility"
+            ]
+        }
+
+    def get_threat_model(self, prompt, prompt_prefix=""):
+        """
+        Get threat model from the LLM response.
+        A stable `prompt_prefix` is sent in the system message so it forms a cacheable
+        prefix, with only the per-request `prompt` in the user message.
+        """
+        method = self.openai_handler.method
+        log.info("Generating threat model using %s", method)
+        
+        try:
+            params, cache_key = self._prepare_threat_model_request(prompt, prompt_prefix)
             
-            # Add provider-specific parameters
-            if method == 'OPENAI':
-                params["response_format"] = {"type": "json_object"}
-                logging.info("Using OpenAI-specific parameters")
-            elif method == 'BEDROCK':
-                logging.info("Using Bedrock-compatible parameters")
+            # Serve repeat runs of the same prompt from the response cache
+            if cache_key:
+                cached_response = self.response_cache.get(cache_key)
+                if cached_response is not None:
+                    log.info("Using cached threat model response")
+                    return cached_response
             
             # Make the API call
-            logging.info(f"Sending request to {method} with model {self.openai_handler.model}")
+            log.info("Sending request to %s with model %s", method, self.openai_handler.model)
             response = self.client.chat.completions.create(**params)
+            if not params.get("stream"):
+                return self._parse_threat_model_text(response.choices[0].message.content, cache_key)
+            stream = response
             
-            # Extract and parse the response content
-            response_text = response.choices[0].message.content
-            logging.info(f"Response content length: {len(response_text)}")
-            logging.debug(f"Response content preview: {response_text[:200]}...")
+            # Stop reading as soon as the JSON object is closed; anything after it is discarded anyway
+            scanner = IncrementalJsonScanner()
+            chunks = []
+            try:
+                for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        chunks.append(delta)
+                        if scanner.feed(delta):
+                            break
+            finally:
+                stream.close()
+            if not scanner.complete:
+                log.warning("Streamed response ended before the JSON object was closed")
             
-            # Clean the response text
-            cleaned_text = self.clean_json_response(response_text)
+            return self._parse_threat_model_text("".join(chunks), cache_key)
+            
+        except Exception as e:
+            return self._threat_model_error_response(e)
+
+    async def aget_threat_model(self, async_client, prompt, prompt_prefix=""):
+        """
+        Async variant of get_threat_model using an AsyncOpenAI client from
+        OpenAIHandler.create_async_client(), so several requests can run concurrently.
+        """
+        method = self.openai_handler.method
+        log.info("Generating threat model using %s (async)", method)
+        
+        try:
+            params, cache_key = self._prepare_threat_model_request(prompt, prompt_prefix)
+            
+            if cache_key:
+                cached_response = self.response_cache.get(cache_key)
+                if cached_response is not None:
+                    log.info("Using cached threat model response")
+                    return cached_response
             
+            log.info("Sending request to %s with model %s", method, self.openai_handler.model)
+            response = await async_client.chat.completions.create(**params)
+            if not params.get("stream"):
+                return self._parse_threat_model_text(response.choices[0].message.content, cache_key)
+            stream = response
+            
+            scanner = IncrementalJsonScanner()
+            chunks = []
             try:
-                # Parse the JSON response
-                response_content = json.loads(cleaned_text)
-                logging.info("Successfully parsed JSON response")
-                
-                # Validate and normalize the response structure
-                normalized_response = self._normalize_threat_model_response(response_content)
-                logging.info("Successfully normalized threat model response")
-                
-                return normalized_response
-                
-            except json.JSONDecodeError as je:
-                logging.error(f"Failed to parse JSON response: {str(je)}")
-                logging.error(f"Response was: {response_text}")
-                raise ValueError(f"Invalid JSON response from {method}: {str(je)}")
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        chunks.append(delta)
+                        if scanner.feed(delta):
+                            break
+            finally:
+                await stream.close()
+            if not scanner.complete:
+                log.warning("Streamed response ended before the JSON object was closed")
+            
+            return self._parse_threat_model_text("".join(chunks), cache_key)
             
         except Exception as e:
-            logging.error(f"Error generating threat model with {method}: {str(e)}")
-            return {
-                "threat_model": [
-                    {
-                        "Threat Type": "Error",
-                        "Scenario": f"Failed to generate threat model with {method}: {str(e)}",
-                        "Potential Impact": "Unable to assess security threats"
-                    }
-                ],
-                "improvement_suggestions": [
-                    "Try again with a more detailed application description",
-                    "Check API key and connection",
-                    f"Verify {method} configuration and model compatibility"
-                ]
-            }
+            return self._threat_model_error_response(e)
             
     def _normalize_threat_model_response(self, response_content):
         """
@@ -265,35 +513,27 @@ Example of valid response format:
         # Handle threat model array
         threats = response_content.get("threat_model", [])
         if not isinstance(threats, list):
-            logging.warning("threat_model is not an array, attempting to normalize")
+            log.warning("threat_model is not an array, attempting to normalize")
             threats = [threats] if threats else []
             
+        # Bind the hot lookups once; parsed JSON objects are always plain dicts
+        append_threat = normalized["threat_model"].append
         for threat in threats:
-            if not isinstance(threat, dict):
-                logging.warning(f"Skipping invalid threat entry: {threat}")
+            if type(threat) is not dict:
+                log.warning("Skipping invalid threat entry: %s", threat)
                 continue
                 
-            # Normalize threat entry
-            normalized_threat = {
-                "Threat Type": threat.get("Threat Type", "Unknown"),
-                "Scenario": threat.get("Scenario", "No scenario provided"),
-                "Potential Impact": threat.get("Potential Impact", "Impact not specified")
-            }
-            
-            # Check for alternative field names
-            if "type" in threat and not normalized_threat["Threat Type"]:
-                normalized_threat["Threat Type"] = threat["type"]
-            if "description" in threat and not normalized_threat["Scenario"]:
-                normalized_threat["Scenario"] = threat["description"]
-            if "impact" in threat and not normalized_threat["Potential Impact"]:
-                normalized_threat["Potential Impact"] = threat["impact"]
-                
-            normalized["threat_model"].append(normalized_threat)
+            # Normalize threat entry, falling back to alternative field names, then defaults
+            get = threat.get
+            append_threat({
+                field: get(field) or get(alias) or default
+                for field, alias, default in _THREAT_FIELD_ALIASES
+            })
             
         # Handle improvement suggestions
         suggestions = response_content.get("improvement_suggestions", [])
         if not isinstance(suggestions, list):
-            logging.warning("improvement_suggestions is not an array, attempting to normalize")
+            log.warning("improvement_suggestions is not an array, attempting to normalize")
             suggestions = [suggestions] if suggestions else []
             
         normalized["improvement_suggestions"] = [
@@ -301,7 +541,7 @@ Example of valid response format:
         ]
         
         if not normalized["threat_model"]:
-            logging.warning("No valid threats found in response")
+            log.warning("No valid threats found in response")
             normalized["threat_model"].append({
                 "Threat Type": "Warning",
                 "Scenario": "No valid threats were identified in the model generation response",
@@ -310,15 +550,17 @@ Example of valid response format:
             
         return normalized
 
-    def generate_threat_model(self, app_type, authentication, internet_facing, sensitive_data, app_input, custom_prompt="", org_context="", assessment_id=None):
+    def generate_threat_model(self, app_type, authentication, internet_facing, sensitive_data, app_input, custom_prompt="", org_context="", assessment_id=None, include_markdown=True):
         """
         Generate a threat model based on the provided inputs.
+        Callers that only need the JSON can pass include_markdown=False to skip
+        rendering; "markdown" is then None.
         """
-        logging.info("Generating threat model")
-        logging.info(f"Custom prompt received in generate_threat_model: '{custom_prompt[:100]}...'")
+        log.info("Generating threat model")
+        log.info("Custom prompt received in generate_threat_model: '%.100s...'", custom_prompt)
         
-        # Create the prompt
-        prompt = self.create_threat_model_prompt(
+        # Create the prompt, keeping the stable prefix separate from the per-request part
+        prompt_prefix, prompt = self.create_threat_model_prompt_parts(
             app_type, 
             authentication, 
             internet_facing, 
@@ -329,15 +571,68 @@ Example of valid response format:
             assessment_id
         )
         
+        # Look for an earlier response to structurally similar inputs
+        semantic_vector = None
+        response = None
+        if self.semantic_cache:
+            try:
+                # Any field may be None or a non-string; the prompt builder accepts both
+                cache_text = "\n".join(str(part or '') for part in [
+                    app_type, authentication, internet_facing, sensitive_data,
+                    str(app_input or '')[:2000], custom_prompt, org_context
+                ])
+                semantic_vector = self.semantic_cache.embed(cache_text)
+                response = self.semantic_cache.lookup(semantic_vector)
+            except Exception as e:
+                log.warning("Semantic cache lookup failed, calling the LLM instead: %s", e)
+        
         # Get the threat model
-        response = self.get_threat_model(prompt)
+        if response is None:
+            response = self.get_threat_model(prompt, prompt_prefix)
+            threats = response.get("threat_model", [])
+            # Never remember the error/warning placeholders produced on failure
+            if semantic_vector is not None and threats and threats[0].get("Threat Type") not in ("Error", "Warning"):
+                self.semantic_cache.add(semantic_vector, response)
         
         # Extract the threat model and improvement suggestions
         threat_model = response.get("threat_model", [])
         improvement_suggestions = response.get("improvement_suggestions", [])
         
         # Convert to markdown, passing the assessment_id
-        markdown = self.json_to_markdown(threat_model, improvement_suggestions, assessment_id)
+        markdown = None
+        if include_markdown:
+            markdown = self.json_to_markdown(threat_model, improvement_suggestions, assessment_id)
+        
+        return {
+            "raw_response": response,
+            "threat_model": threat_model,
+            "improvement_suggestions": improvement_suggestions,
+            "markdown": markdown
+        }
+
+    async def agenerate_threat_model(self, async_client, app_type, authentication, internet_facing, sensitive_data, app_input, custom_prompt="", org_context="", assessment_id=None, include_markdown=True):
+        """
+        Async variant of generate_threat_model. The semantic cache is not consulted,
+        since its embedding call is synchronous.
+        """
+        prompt_prefix, prompt = self.create_threat_model_prompt_parts(
+            app_type, 
+            authentication, 
+            internet_facing, 
+            sensitive_data, 
+            app_input, 
+            custom_prompt,
+            org_context,
+            assessment_id
+        )
+        
+        response = await self.aget_threat_model(async_client, prompt, prompt_prefix)
+        
+        threat_model = response.get("threat_model", [])
+        improvement_suggestions = response.get("improvement_suggestions", [])
+        markdown = None
+        if include_markdown:
+            markdown = self.json_to_markdown(threat_model, improvement_suggestions, assessment_id)
         
         return {
             "raw_response": response,
@@ -345,3 +640,18 @@ Example of valid response format:
             "improvement_suggestions": improvement_suggestions,
             "markdown": markdown
         }
+
+    async def agenerate_threat_models(self, requests, max_concurrency=10):
+        """
+        Generate several threat models concurrently. `requests` is a list of keyword
+        argument dicts for generate_threat_model; results are returned in the same order.
+        At most `max_concurrency` LLM calls are in flight at once.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async with self.openai_handler.create_async_client() as async_client:
+            async def run(kwargs):
+                async with semaphore:
+                    return await self.agenerate_threat_model(async_client, **kwargs)
+            
+            return await asyncio.gather(*(run(kwargs) for kwargs in requests))
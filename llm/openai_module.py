@@ -1,32 +1,91 @@
-from openai import OpenAI
-from utils.config import get_openai_api_key, get_llm_method, get_bedrock_config
+from openai import AsyncOpenAI, OpenAI, DefaultHttpxClient
+from utils.config import get_openai_api_key, get_llm_method, get_bedrock_config, get_verify_llm_connection
+import hashlib
 import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+# One HTTP connection pool for every client this process creates. Handlers are built
+# per request, and giving each its own pool meant a fresh TCP/TLS handshake every time;
+# sharing it lets concurrent DREAD, mitigation and threat model calls reuse keep-alive
+# sockets. DefaultHttpxClient keeps the SDK's own timeout and pool-size defaults.
+_shared_http_client = DefaultHttpxClient()
+
+# Extra chat completion parameters for JSON output, looked up once per handler.
+# Bedrock gateways may not support response_format, so nothing is added there.
+JSON_MODE_PARAMS = {
+    'OPENAI': {"response_format": {"type": "json_object"}},
+    'BEDROCK': {},
+}
+
+# Endpoints already verified in this process, keyed by (method, base_url, api key hash)
+_verified_endpoints = set()
+
+def _verify_connection(client, method, base_url, api_key):
+    """
+    List models to check connectivity, at most once per endpoint and only when
+    THREATSHIELD_VERIFY_LLM is enabled. Otherwise problems surface on the first real call.
+    """
+    if not get_verify_llm_connection():
+        return
+    key = (method, base_url, hashlib.sha256(api_key.encode()).hexdigest())
+    if key in _verified_endpoints:
+        return
+    _verified_endpoints.add(key)
+    
+    log.info("Testing %s connection...", method)
+    try:
+        models = client.models.list()
+        log.info("%s connection successful. Available models: %s", method, len(models.data))
+    except Exception as e:
+        log.warning("Could not verify %s connection: %s", method, e)
+        log.warning("Continuing with initialization, but API calls may fail")
 
 class OpenAIHandler:
+    _default = None
+    _default_lock = threading.Lock()
+
+    @classmethod
+    def get_default(cls):
+        """Return the process-wide handler for the configured LLM method, creating it on first use."""
+        if cls._default is None:
+            with cls._default_lock:
+                if cls._default is None:
+                    cls._default = cls()
+        return cls._default
+
     def __init__(self, model=None):
         self.method = get_llm_method()
         
         if self.method == 'OPENAI':
             self.api_key = get_openai_api_key()
             if not self.api_key:
-                logging.error("OpenAI API key not found")
+                log.error("OpenAI API key not found")
                 raise ValueError("OpenAI API key not found")
             self.model = model or "gpt-4o"
         elif self.method == 'BEDROCK':
             bedrock_config = get_bedrock_config()
             self.api_key = bedrock_config['api_key']
             if not self.api_key:
-                logging.error("Bedrock API key not found")
+                log.error("Bedrock API key not found")
                 raise ValueError("Bedrock API key not found")
             self.base_url = bedrock_config['base_url']
             if not self.base_url:
-                logging.error("Bedrock base URL not found")
+                log.error("Bedrock base URL not found")
                 raise ValueError("Bedrock base URL not found")
             self.model = model or bedrock_config['model']
         else:
-            logging.error(f"Unsupported LLM method: {self.method}")
+            log.error("Unsupported LLM method: %s", self.method)
             raise ValueError(f"Unsupported LLM method: {self.method}")
             
+        # Per-method request options, resolved here so call sites don't branch on the method
+        self.json_mode_params = JSON_MODE_PARAMS[self.method]
+        self.supports_prompt_cache_key = self.method == 'OPENAI'
+        self.supports_structured_outputs = self.method == 'OPENAI'
+        # Bedrock's OpenAI-compatible endpoint isn't relied on to stream chat completions
+        self.supports_streaming = self.method == 'OPENAI'
+            
         self._client = self.initialize_openai_client()
         
     @property
@@ -36,52 +95,48 @@ class OpenAIHandler:
         
     def initialize_openai_client(self):
         try:
-            logging.info(f"Initializing client for {self.method} method")
+            log.info("Initializing client for %s method", self.method)
             
             if self.method == 'OPENAI':
-                client = OpenAI(api_key=self.api_key)
-                # Test connection with a simple request
-                logging.info("Testing OpenAI connection...")
-                try:
-                    models = client.models.list()
-                    logging.info(f"OpenAI connection successful. Available models: {len(models.data)}")
-                except Exception as e:
-                    logging.warning(f"Could not list OpenAI models: {str(e)}")
-                    logging.warning("Continuing with initialization, but API calls may fail")
+                client = OpenAI(api_key=self.api_key, http_client=_shared_http_client)
+                _verify_connection(client, self.method, None, self.api_key)
                 return client
                 
             elif self.method == 'BEDROCK':
-                logging.info(f"Connecting to Bedrock at {self.base_url}")
+                log.info("Connecting to Bedrock at %s", self.base_url)
                 # Use default_headers instead of api_key to bypass OpenAI's API key validation
                 client = OpenAI(
                     base_url=self.base_url,
-                    default_headers={"Authorization": f"Bearer {self.api_key}"}
+                    default_headers={"Authorization": f"Bearer {self.api_key}"},
+                    http_client=_shared_http_client
                 )
-                
-                # Test connection with a simple request
-                logging.info("Testing Bedrock connection...")
-                try:
-                    # Try to list models or make a simple request to verify connection
-                    models = client.models.list()
-                    logging.info(f"Bedrock connection successful. Available models: {len(models.data)}")
-                except Exception as e:
-                    logging.error(f"Failed to verify Bedrock connection: {str(e)}")
-                    logging.error(f"Error details: {str(e)}")
-                    logging.error("Continuing with initialization, but API calls may fail")
-                    
+                _verify_connection(client, self.method, self.base_url, self.api_key)
                 return client
         except Exception as e:
             error_msg = f"Failed to initialize {self.method} client: {str(e)}"
-            logging.error(error_msg)
+            log.error(error_msg)
             raise ConnectionError(error_msg)
 
+    def create_async_client(self):
+        """
+        Create an AsyncOpenAI client for the configured method, for running several
+        completions concurrently. Its connection pool is bound to the running event
+        loop, so create one per asyncio.run() and close it when done.
+        """
+        if self.method == 'BEDROCK':
+            return AsyncOpenAI(
+                base_url=self.base_url,
+                default_headers={"Authorization": f"Bearer {self.api_key}"}
+            )
+        return AsyncOpenAI(api_key=self.api_key)
+
     def send_prompt(self, prompt):
         try:
-            logging.info(f"Sending prompt to {self.method} using model {self.model}")
+            log.info("Sending prompt to %s using model %s", self.method, self.model)
             
             # Log request details for debugging
-            logging.debug(f"Request details - Model: {self.model}, Method: {self.method}")
-            logging.debug(f"Prompt content: {prompt[:100]}..." if len(prompt) > 100 else f"Prompt content: {prompt}")
+            log.debug("Request details - Model: %s, Method: %s", self.model, self.method)
+            log.debug("Prompt content: %.100s", prompt)
             
             try:
                 response = self.client.chat.completions.create(
@@ -92,42 +147,42 @@ class OpenAIHandler:
                     max_tokens=150
                 )
                 
-                logging.info(f"Successfully received response from {self.method}")
+                log.info("Successfully received response from %s", self.method)
                 return response.choices[0].message.content.strip()
                 
             except Exception as e:
                 # Add more detailed error logging for API-specific errors
                 if self.method == 'BEDROCK':
-                    logging.error(f"Bedrock API error: {str(e)}")
-                    logging.error("Check if your Bedrock API supports the OpenAI chat completions format")
-                    logging.error(f"Model being used: {self.model}")
+                    log.error("Bedrock API error: %s", e)
+                    log.error("Check if your Bedrock API supports the OpenAI chat completions format")
+                    log.error("Model being used: %s", self.model)
                 else:
-                    logging.error(f"OpenAI API error: {str(e)}")
+                    log.error("OpenAI API error: %s", e)
                 
                 raise
             
         except Exception as e:
             error_msg = f"Error sending prompt to {self.method}: {str(e)}"
-            logging.error(error_msg)
+            log.error(error_msg)
             raise RuntimeError(error_msg)
 
     def create_chat_template(self, template_name):
         try:
-            logging.info(f"Creating chat template '{template_name}' using {self.method}")
+            log.info("Creating chat template '%s' using %s", template_name, self.method)
             # Create and return a chat template based on the template name
             # This is a placeholder for actual chat template creation
             result = f"Chat template for {template_name} created"
-            logging.info(f"Successfully created chat template '{template_name}'")
+            log.info("Successfully created chat template '%s'", template_name)
             return result
         except Exception as e:
             error_msg = f"Error creating chat template '{template_name}': {str(e)}"
-            logging.error(error_msg)
+            log.error(error_msg)
             raise RuntimeError(error_msg)
             
     def get_completion(self, prompt, max_tokens=1000):
         """Get completion from the LLM."""
         try:
-            logging.info(f"Getting completion from {self.method} using model {self.model}")
+            log.info("Getting completion from %s using model %s", self.method, self.model)
             
             response = self.client.chat.completions.create(
                 model=self.model,
@@ -137,10 +192,10 @@ class OpenAIHandler:
                 max_tokens=max_tokens
             )
             
-            logging.info(f"Successfully received completion from {self.method}")
+            log.info("Successfully received completion from %s", self.method)
             return response.choices[0].message.content.strip()
             
         except Exception as e:
             error_msg = f"Error getting completion from {self.method}: {str(e)}"
-            logging.error(error_msg)
+            log.error(error_msg)
             raise RuntimeError(error_msg)
@@ -0,0 +1,104 @@
+import logging
+import random
+import threading
+import time
+from openai import RateLimitError
+from utils.config import get_llm_rate_limits
+
+# Rough characters-per-token ratio used to estimate prompt size before sending
+CHARS_PER_TOKEN = 4
+
+class RateLimiter:
+    """
+    Thread-safe token bucket that paces LLM requests against a requests-per-minute
+    and tokens-per-minute budget, so batch workloads wait for capacity up front
+    instead of burning time on 429 responses and backoff.
+
+    Either limit may be None to leave that dimension unthrottled. When the provider
+    still answers with a 429, every caller sharing the limiter pauses for the
+    Retry-After interval before the request is retried.
+    """
+
+    def __init__(self, rpm=None, tpm=None, max_retries=3):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self._request_allowance = float(rpm or 0)
+        self._token_allowance = float(tpm or 0)
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+
+    def _refill(self, now):
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        if self.rpm:
+            self._request_allowance = min(self.rpm, self._request_allowance + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._token_allowance = min(self.tpm, self._token_allowance + elapsed * self.tpm / 60)
+
+    def acquire(self, tokens=0):
+        """Block until one request consuming `tokens` tokens fits in the budget."""
+        # A single request larger than the whole per-minute budget can never fit; cap it
+        if self.tpm:
+            tokens = min(tokens, self.tpm)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._paused_until - now
+                if self.rpm and self._request_allowance < 1:
+                    wait = max(wait, (1 - self._request_allowance) * 60 / self.rpm)
+                if self.tpm and self._token_allowance < tokens:
+                    wait = max(wait, (tokens - self._token_allowance) * 60 / self.tpm)
+                if wait <= 0:
+                    if self.rpm:
+                        self._request_allowance -= 1
+                    if self.tpm:
+                        self._token_allowance -= tokens
+                    return
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Hold back all callers for `seconds`, e.g. after a 429 with Retry-After."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    @staticmethod
+    def estimate_tokens(params):
+        """Estimate the tokens a chat completion counts against the TPM limit."""
+        prompt_chars = sum(len(str(message.get("content", ""))) for message in params.get("messages", []))
+        return prompt_chars // CHARS_PER_TOKEN + params.get("max_tokens", 0)
+
+    def _call_with_retry(self, create, tokens, params):
+        """Call `create(**params)` within the rate budget, pausing and retrying on 429s."""
+        for attempt in range(self.max_retries + 1):
+            self.acquire(tokens)
+            try:
+                return create(**params)
+            except RateLimitError as e:
+                if attempt == self.max_retries:
+                    raise
+                retry_after = e.response.headers.get("retry-after") if e.response is not None else None
+                try:
+                    delay = float(retry_after)
+                except (TypeError, ValueError):
+                    # Exponential backoff with jitter so concurrent callers don't retry in lockstep
+                    delay = 2 ** attempt + random.uniform(0, 1)
+                logging.warning(f"Rate limited by LLM provider, pausing requests for {delay:.1f}s")
+                self.pause(delay)
+
+    def create_chat_completion(self, client, **params):
+        """Send a chat completion through `client` once the rate budget allows it."""
+        return self._call_with_retry(client.chat.completions.create, self.estimate_tokens(params), params)
+
+    def create_embeddings(self, client, **params):
+        """Send an embeddings request through `client` once the rate budget allows it."""
+        texts = params.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        tokens = sum(len(text) for text in texts) // CHARS_PER_TOKEN
+        return self._call_with_retry(client.embeddings.create, tokens, params)
+
+# Shared by every handler so concurrent requests draw from the same budget
+rate_limiter = RateLimiter(**get_llm_rate_limits())
@@ -0,0 +1,157 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+import orjson
+
+DEFAULT_CACHE_PATH = os.path.join('storage', 'threat_model_cache.db')
+
+class ThreatModelCache:
+    """
+    Persistent cache of normalized threat model responses, keyed by a hash of the
+    canonical prompt, so repeat runs with identical inputs skip the LLM round-trip.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=None):
+        """
+        Args:
+            path: SQLite database file backing the cache
+            ttl: Seconds an entry stays valid; None keeps entries forever
+        """
+        self.path = path
+        self.ttl = ttl
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # One connection shared across Flask worker threads, serialized by the lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, response BLOB NOT NULL, created REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(*parts):
+        """Hash the prompt parts after collapsing whitespace, so cosmetic differences still hit."""
+        canonical = "\n".join(" ".join(part.split()) for part in parts)
+        return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+    def get(self, key):
+        """Return the cached response for `key`, or None if missing or expired."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        response, created = row
+        if self.ttl is not None and time.time() - created > self.ttl:
+            return None
+        return orjson.loads(response)
+
+    def set(self, key, response):
+        """Store a normalized response under `key`, replacing any previous entry."""
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, created) VALUES (?, ?, ?)",
+                    (key, orjson.dumps(response), time.time())
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            # A cache write failure must never fail the request itself
+            logging.warning(f"Could not write threat model cache entry: {str(e)}")
+
+    def clear(self):
+        """Remove every cached response."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+DEFAULT_SEMANTIC_CACHE_PATH = os.path.join('storage', 'threat_model_semantic_cache.json')
+
+class SemanticThreatModelCache:
+    """
+    In-memory cache that reuses a previous threat model when a new request's inputs
+    are near-duplicates of an earlier one, measured by cosine similarity of their
+    embeddings. Entries are persisted to disk so they survive a restart.
+    """
+
+    def __init__(self, client, threshold, path=DEFAULT_SEMANTIC_CACHE_PATH,
+                 model="text-embedding-3-small", max_entries=256):
+        """
+        Args:
+            client: OpenAI-compatible client used to embed request inputs
+            threshold: Minimum cosine similarity for a cached response to be reused
+            path: JSON file the embeddings and responses are persisted to
+            model: Embedding model name
+            max_entries: Oldest entries are dropped beyond this many
+        """
+        self.client = client
+        self.threshold = threshold
+        self.path = path
+        self.model = model
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._embeddings = np.empty((0, 0), dtype=np.float32)
+        self._responses = []
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                data = orjson.loads(f.read())
+            self._embeddings = np.asarray(data["embeddings"], dtype=np.float32)
+            self._responses = data["responses"]
+        except FileNotFoundError:
+            pass
+        except (orjson.JSONDecodeError, KeyError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable semantic cache file {self.path}: {str(e)}")
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'wb') as f:
+            f.write(orjson.dumps(
+                {"embeddings": self._embeddings, "responses": self._responses},
+                option=orjson.OPT_SERIALIZE_NUMPY
+            ))
+
+    def embed(self, text):
+        """Return the L2-normalized embedding of `text`."""
+        response = self.client.embeddings.create(model=self.model, input=text)
+        vector = np.asarray(response.data[0].embedding, dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def lookup(self, vector):
+        """Return the cached response most similar to `vector` if it clears the threshold."""
+        with self._lock:
+            if not self._responses or self._embeddings.shape[1] != vector.shape[0]:
+                return None
+            # Rows are normalized, so one matrix-vector product gives every cosine similarity
+            scores = self._embeddings @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            logging.info(f"Semantic cache hit with similarity {scores[best]:.3f}")
+            return self._responses[best]
+
+    def add(self, vector, response):
+        """Remember `response` for inputs similar to `vector`."""
+        with self._lock:
+            if self._responses and self._embeddings.shape[1] != vector.shape[0]:
+                # Embedding model changed; earlier vectors are not comparable
+                self._embeddings = np.empty((0, 0), dtype=np.float32)
+                self._responses = []
+            if self._responses:
+                self._embeddings = np.vstack([self._embeddings, vector])[-self.max_entries:]
+            else:
+                self._embeddings = vector[np.newaxis, :]
+            self._responses = (self._responses + [response])[-self.max_entries:]
+            try:
+                self._save()
+            except OSError as e:
+                logging.warning(f"Could not persist semantic cache: {str(e)}")
@@ -1,23 +1,75 @@
 import os
 import uuid
+import hashlib
 import json
 import base64
+import shutil
 import logging
-import numpy as np
+import threading
+import orjson
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from functools import cached_property, lru_cache
 from pathlib import Path
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
 from llm.openai_module import OpenAIHandler
-from utils.config import get_llm_method
+from llm.rate_limiter import CHARS_PER_TOKEN, rate_limiter
+from utils.config import get_embedding_config, get_llm_method
 from utils.storage import StorageHandler
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Module logger; handlers and levels are configured by the application entrypoint
+log = logging.getLogger(__name__)
 
-@dataclass
+# Contexts retrieved per handler, keyed by the exact query text. Near-duplicate queries are
+# deliberately not matched: per-service queries differ only by the service name
+QUERY_CACHE_SIZE = 256
+
+# Upper bound on retrieved context per query, roughly 6000 tokens at 4 characters per token
+CONTEXT_MAX_CHARS = 24000
+
+# Concurrent section/microservice LLM calls in rag_main
+ASK_AI_MAX_CONCURRENCY = 8
+
+# Chunks per Chroma insert
+EMBED_BATCH_SIZE = 256
+
+# Written into a persist directory once its vector database is fully built
+VECTOR_DB_COMPLETE_MARKER = ".complete"
+
+# One lock per persist directory, held while its database is checked and built, so a
+# concurrent request for the same contents waits for the build instead of removing it
+_vector_db_locks = {}
+_vector_db_locks_guard = threading.Lock()
+# Per-request limits for embeddings: the API accepts at most 2048 inputs and about 300k
+# tokens, so texts are packed greedily up to whichever (estimated) limit is hit first
+EMBED_BATCH_MAX_ITEMS = 2048
+EMBED_BATCH_MAX_TOKENS = 200000
+# Embedding batches in flight at once during ingestion
+EMBED_MAX_CONCURRENCY = 4
+
+def _vector_db_lock(persist_dir: str) -> threading.Lock:
+    with _vector_db_locks_guard:
+        return _vector_db_locks.setdefault(persist_dir, threading.Lock())
+
+class Service(BaseModel):
+    """A microservice identified in an architecture diagram."""
+    model_config = ConfigDict(extra="forbid", strict=True)
+
+    Name: str
+
+class ServiceList(BaseModel):
+    """Schema of the architecture analysis response; validated by pydantic's compiled core."""
+    model_config = ConfigDict(strict=True)
+
+    services: List[Service] = Field(min_length=1)
+
+@dataclass(frozen=True)
 class Prompt:
     system_context: str
     task: str
@@ -26,6 +78,22 @@ class Prompt:
     example: Optional[str] = None
     instructions: Optional[str] = None
 
+    @cached_property
+    def example_json(self) -> str:
+        """The format example serialized as indented JSON, computed on first use."""
+        example = self.format.get("example", {}) if isinstance(self.format, dict) else {}
+        return orjson.dumps(example, option=orjson.OPT_INDENT_2).decode()
+
+@lru_cache(maxsize=256)
+def _format_template(template: str, kwargs: tuple) -> str:
+    """Format a prompt template; memoized since the same sections are formatted repeatedly."""
+    return template.format(**dict(kwargs))
+
+@lru_cache(maxsize=8)
+def _encode_image_file(image_path: str, mtime_ns: int, size: int) -> str:
+    """Base64-encode an image file; memoized since a diagram may be analyzed more than once."""
+    return base64.b64encode(Path(image_path).read_bytes()).decode("utf-8")
+
 class PromptManager:
     def __init__(self, prompt_file: str = "rag/prompts.json"):
         self.prompts: Dict[str, Prompt] = {}
@@ -39,7 +107,7 @@ class PromptManager:
                     key: Prompt(**value) for key, value in data.items()
                 }
         except Exception as e:
-            logging.error(f"Error loading prompts: {e}")
+            log.error("Error loading prompts: %s", e)
             raise
 
     def get_prompt(self, key: str, **kwargs) -> Prompt:
@@ -47,11 +115,21 @@ class PromptManager:
         if not prompt:
             raise ValueError(f"Prompt '{key}' not found")
         
-        # Handle any string formatting in the prompt
+        # Handle any string formatting in the prompt, returning a formatted copy so the
+        # stored template is never modified
         if kwargs:
-            prompt.task = prompt.task.format(**kwargs)
-            if prompt.query:
-                prompt.query = prompt.query.format(**kwargs)
+            format_args = tuple(sorted(kwargs.items()))
+            try:
+                hash(format_args)
+                format_template = lambda template: _format_template(template, format_args)
+            except TypeError:
+                # Unhashable values (e.g. a list of services) can't key the cache
+                format_template = lambda template: template.format(**kwargs)
+            prompt = replace(
+                prompt,
+                task=format_template(prompt.task),
+                query=format_template(prompt.query) if prompt.query else prompt.query
+            )
         return prompt
 
 class CustomEmbeddings(Embeddings):
@@ -60,55 +138,99 @@ class CustomEmbeddings(Embeddings):
     def __init__(self, client, method):
         self.client = client
         self.method = method
+        config = get_embedding_config()
+        self.model = config['model']
+        # Shortened embeddings (Matryoshka truncation) cut storage and search cost
+        # with little loss in retrieval quality
+        self.dimensions = config['dimensions']
         
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         """Get embeddings for a list of texts."""
         try:
-            logging.info(f"Getting embeddings for {len(texts)} texts using {self.method}")
+            log.info("Getting embeddings for %d texts using %s", len(texts), self.method)
             
-            # Prepare common parameters
-            params = {
-                "model": "text-embedding-3-large" if self.method == 'OPENAI' else "text-embedding-3-large",
-                "input": texts
-            }
+            params = {"model": self.model}
+            if self.dimensions:
+                params["dimensions"] = self.dimensions
             
-            # Make the API call
-            response = self.client.embeddings.create(**params)
+            batches = self._token_budget_batches(texts)
             
-            # Extract embeddings from response
-            embeddings = [data.embedding for data in response.data]
-            logging.info(f"Successfully generated {len(embeddings)} embeddings")
+            def embed_batch(batch):
+                response = rate_limiter.create_embeddings(self.client, input=batch, **params)
+                return [data.embedding for data in response.data]
+            
+            if len(batches) > 1:
+                # Overlap the network round-trips of several batches; map() keeps input order
+                with ThreadPoolExecutor(max_workers=EMBED_MAX_CONCURRENCY) as executor:
+                    results = list(executor.map(embed_batch, batches))
+            else:
+                results = [embed_batch(batch) for batch in batches]
+            embeddings = [embedding for batch_embeddings in results for embedding in batch_embeddings]
+            log.info("Successfully generated %d embeddings", len(embeddings))
             
             return embeddings
             
         except Exception as e:
             error_msg = f"Error getting embeddings from {self.method}: {str(e)}"
-            logging.error(error_msg)
+            log.error(error_msg)
             raise RuntimeError(error_msg)
             
+    @staticmethod
+    def _token_budget_batches(texts: List[str]) -> List[List[str]]:
+        """Pack texts, in order, into as few requests as the item and token limits allow."""
+        batches = []
+        batch, batch_tokens = [], 0
+        for text in texts:
+            # Estimated from length; close enough to stay well under the provider limit
+            tokens = len(text) // CHARS_PER_TOKEN + 1
+            if batch and (len(batch) >= EMBED_BATCH_MAX_ITEMS or batch_tokens + tokens > EMBED_BATCH_MAX_TOKENS):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
     def embed_query(self, text: str) -> List[float]:
         """Get embedding for a single text."""
         return self.embed_documents([text])[0]
 
 class RAGHandler:
+    # Built on first use and shared by every handler; the splitter holds no per-call state
+    _text_splitter = None
+
     def __init__(self, openai_handler: OpenAIHandler, persist_dir: str, assessment_id: str, table_name: str = "docs"):
         self.openai_handler = openai_handler
-        self.persist_dir = str(Path(persist_dir) / str(uuid.uuid4()))
+        # The database itself lives in a subdirectory named after its contents, chosen in
+        # setup_documents, so identical inputs reuse an earlier index instead of re-embedding
+        self.persist_base = persist_dir
+        self.persist_dir = None
         self.table_name = table_name
         self.prompt_manager = PromptManager()
         self.client = openai_handler.client
         self.method = get_llm_method()
         self.storage_handler = StorageHandler()
         self.assessment_id = assessment_id
-        logging.info(f"Initializing RAG with {self.method} method for assessment {assessment_id}")
+        log.info("Initializing RAG with %s method for assessment %s", self.method, assessment_id)
 
         # Create proper embedding class for Chroma
         self.embeddings = CustomEmbeddings(self.client, self.method)
 
+        # Query text -> retrieved context, in LRU order
+        self._query_cache = OrderedDict()
+
+        # Services from the most recent architecture diagram analysis, also saved to
+        # files/microservices.json
+        self._services = None
+
+        # Number of chunks in the vector database, recorded once when it is created or loaded
+        self._collection_size = 0
+
     def get_completion(self, prompt: str, max_tokens: int = 1000) -> str:
         """Get completion from the LLM."""
         try:
-            logging.info(f"Getting completion from {self.method} using model {self.openai_handler.model}")
+            log.info("Getting completion from %s using model %s", self.method, self.openai_handler.model)
             
             # Prepare common parameters
             params = {
@@ -134,222 +256,213 @@ class RAGHandler:
             
         except Exception as e:
             error_msg = f"Error getting completion from {self.method}: {str(e)}"
-            logging.error(error_msg)
+            log.error(error_msg)
             raise RuntimeError(error_msg)
 
+    @classmethod
+    def _get_text_splitter(cls) -> RecursiveCharacterTextSplitter:
+        """Return the shared text splitter, creating it on first use."""
+        if cls._text_splitter is None:
+            # Use a simpler text splitter with larger chunks
+            cls._text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=2000,  # Larger chunks
+                chunk_overlap=100,  # Smaller overlap
+                separators=["\n\n", "\n", ".", " ", ""],  # More granular separators
+                keep_separator=True
+            )
+        return cls._text_splitter
+
     def split_documents(self, documents: List[Any]) -> List[Any]:
         """Split documents into chunks for processing."""
         # Validate input documents
         if not documents:
-            print("[DEBUG] ERROR: Empty document list provided to split_documents")
             raise ValueError("Empty document list provided")
             
-        print(f"[DEBUG] split_documents: Processing {len(documents)} documents")
+        log.debug("split_documents: Processing %d documents", len(documents))
             
         # Log document content for debugging
-        for i, doc in enumerate(documents):
-            content = doc.page_content if hasattr(doc, 'page_content') else str(doc)
-            content_length = len(content)
-            logging.info(f"Document {i+1} content length: {content_length}")
-            print(f"[DEBUG] Document {i+1} content length: {content_length}")
-            
-            if content_length > 0:
-                sample = content[:100] + "..." if content_length > 100 else content
-                logging.info(f"Document {i+1} first 100 chars: {content[:100]}")
-                print(f"[DEBUG] Document {i+1} first 100 chars: {sample}")
-            else:
-                logging.warning(f"Document {i+1} is empty")
-                print(f"[DEBUG] WARNING: Document {i+1} is empty")
+        if log.isEnabledFor(logging.DEBUG):
+            for i, doc in enumerate(documents):
+                content = doc.page_content if hasattr(doc, 'page_content') else str(doc)
+                log.debug("Document %d content length: %d, first 100 chars: %.100s", i+1, len(content), content)
                 
-        # Use a simpler text splitter with larger chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=2000,  # Larger chunks
-            chunk_overlap=100,  # Smaller overlap
-            separators=["\n\n", "\n", ".", " ", ""],  # More granular separators
-            keep_separator=True
-        )
-        print(f"[DEBUG] Using text splitter with chunk_size=2000, chunk_overlap=100")
-        
-        # Process each document individually to ensure proper chunking
-        all_splits = []
+        # Skip documents without extractable text, keeping the original numbering for sources
+        texts, metadatas = [], []
         for i, doc in enumerate(documents):
-            try:
-                # Extract text content from the document
-                text = doc.page_content if hasattr(doc, 'page_content') else str(doc)
-                if not text.strip():
-                    logging.warning(f"Document {i+1} contains only whitespace")
-                    print(f"[DEBUG] WARNING: Document {i+1} contains only whitespace")
-                    continue
-                
-                print(f"[DEBUG] Splitting document {i+1} with length {len(text)}")
-                
-                # Split text into chunks first
-                text_chunks = text_splitter.split_text(text)
-                if not text_chunks:
-                    logging.warning(f"Document {i+1} generated no text chunks")
-                    print(f"[DEBUG] WARNING: Document {i+1} generated no text chunks")
-                    continue
-                    
-                print(f"[DEBUG] Document {i+1} split into {len(text_chunks)} text chunks")
-                    
-                # Create documents from chunks with metadata
-                doc_chunks = []
-                for j, chunk in enumerate(text_chunks):
-                    if chunk.strip():  # Only create documents for non-empty chunks
-                        doc_chunks.append({
-                            "page_content": chunk,
-                            "metadata": {
-                                "source": f"document_{i+1}",
-                                "chunk": j+1,
-                                "total_chunks": len(text_chunks)
-                            }
-                        })
-                
-                if doc_chunks:
-                    all_splits.extend(doc_chunks)
-                    logging.info(f"Document {i+1} split into {len(doc_chunks)} chunks")
-                    print(f"[DEBUG] Document {i+1} created {len(doc_chunks)} document chunks")
-                    
-                    # Print sample of first chunk
-                    first_chunk = doc_chunks[0]['page_content']
-                    sample = first_chunk[:100] + "..." if len(first_chunk) > 100 else first_chunk
-                    logging.info(f"First chunk content sample: {first_chunk[:100]}")
-                    print(f"[DEBUG] First chunk content sample: {sample}")
-                    
-            except Exception as e:
-                logging.error(f"Error splitting document {i+1}: {str(e)}")
-                print(f"[DEBUG] ERROR splitting document {i+1}: {str(e)}")
+            text = doc.page_content if hasattr(doc, 'page_content') else str(doc)
+            if not text.strip():
+                log.warning("Document %d contains only whitespace", i+1)
                 continue
+            texts.append(text)
+            metadatas.append({"source": f"document_{i+1}"})
+        
+        # Split every document in one call; each chunk carries its document's metadata
+        all_splits = [
+            chunk for chunk in self._get_text_splitter().create_documents(texts, metadatas=metadatas)
+            if chunk.page_content.strip()
+        ]
                 
         if not all_splits:
-            print("[DEBUG] ERROR: No valid chunks were generated from the documents")
             raise ValueError("No valid chunks were generated from the documents. Check if the documents contain extractable text content.")
             
-        logging.info(f"Total: Created {len(all_splits)} chunks from {len(documents)} documents")
-        print(f"[DEBUG] Total: Created {len(all_splits)} chunks from {len(documents)} documents")
+        log.info("Total: Created %d chunks from %d documents", len(all_splits), len(documents))
         return all_splits
 
     def create_vector_db(self, documents: List[Any]) -> Chroma:
         """Create or load vector database."""
-        logging.info(f"Creating or loading vector database for {self.persist_dir}")
-        print(f"[DEBUG] Creating or loading vector database for {self.persist_dir}")
+        log.info("Creating or loading vector database for %s", self.persist_dir)
         
         if not documents:
-            print("[DEBUG] ERROR: No documents provided for vector database creation")
             raise ValueError("No documents provided for vector database creation")
             
-        print(f"[DEBUG] Processing {len(documents)} documents for vector database")
-            
-        # Convert document dictionaries to Document objects if needed
-        from langchain_core.documents import Document
-        processed_docs = []
-        for i, doc in enumerate(documents):
-            if isinstance(doc, dict):
-                processed_docs.append(Document(
-                    page_content=doc["page_content"],
-                    metadata=doc.get("metadata", {})
-                ))
-            else:
-                processed_docs.append(doc)
-                
-        print(f"[DEBUG] Converted {len(processed_docs)} documents to Document objects")
-                
         if os.path.exists(self.persist_dir):
-            print(f"[DEBUG] Loading existing vector database from {self.persist_dir}")
-            db = Chroma(
-                persist_directory=self.persist_dir,
-                embedding_function=self.embeddings,
-                collection_name=self.table_name
-            )
-            doc_count = db._collection.count()
-            logging.info(f"Loaded existing vector database with {doc_count} documents")
-            print(f"[DEBUG] Loaded existing vector database with {doc_count} documents")
-            return db
+            # Only reuse a database whose build finished and holds every chunk; an interrupted
+            # build leaves a partial directory under the same content hash
+            if os.path.exists(os.path.join(self.persist_dir, VECTOR_DB_COMPLETE_MARKER)):
+                db = Chroma(
+                    persist_directory=self.persist_dir,
+                    embedding_function=self.embeddings,
+                    collection_name=self.table_name
+                )
+                doc_count = db._collection.count()
+                if doc_count == len(documents):
+                    self._collection_size = doc_count
+                    log.info("Loaded existing vector database with %d documents", doc_count)
+                    return db
+                log.warning("Vector database %s has %d of %d documents, rebuilding", self.persist_dir, doc_count, len(documents))
+            else:
+                log.warning("Vector database %s was never completed, rebuilding", self.persist_dir)
+            shutil.rmtree(self.persist_dir)
         
-        # Create new database with processed documents
+        # Create new database from the split documents
         try:
-            print(f"[DEBUG] Creating new vector database with {len(processed_docs)} documents")
-            db = Chroma.from_documents(
-                documents=processed_docs,
-                embedding=self.embeddings,
+            log.debug("Creating new vector database with %d documents", len(documents))
+            db = Chroma(
                 persist_directory=self.persist_dir,
+                embedding_function=self.embeddings,
                 collection_metadata={"hnsw:space": "cosine"},
                 collection_name=self.table_name
             )
+            
+            # Embed every chunk up front in large batches, then insert straight into the
+            # underlying collection, one add per batch
+            texts = [doc.page_content for doc in documents]
+            metadatas = [doc.metadata for doc in documents]
+            embeddings = self.embeddings.embed_documents(texts)
+            for start in range(0, len(texts), EMBED_BATCH_SIZE):
+                end = start + EMBED_BATCH_SIZE
+                db._collection.add(
+                    ids=[str(uuid.uuid4()) for _ in texts[start:end]],
+                    embeddings=embeddings[start:end],
+                    documents=texts[start:end],
+                    metadatas=metadatas[start:end]
+                )
             doc_count = db._collection.count()
-            logging.info(f"Created new vector database with {doc_count} documents")
-            print(f"[DEBUG] Successfully created new vector database with {doc_count} documents")
+            self._collection_size = doc_count
+            log.info("Created new vector database with %d documents", doc_count)
             
             if doc_count == 0:
-                print("[DEBUG] ERROR: Vector database was created but contains no documents")
                 raise ValueError("Vector database was created but contains no documents")
-                
+            
+            # Written last, so only a fully built database is ever reused
+            Path(self.persist_dir, VECTOR_DB_COMPLETE_MARKER).touch()
             return db
             
         except Exception as e:
-            logging.error(f"Error creating vector database: {str(e)}")
-            print(f"[DEBUG] ERROR creating vector database: {str(e)}")
+            log.error("Error creating vector database: %s", e)
             if os.path.exists(self.persist_dir):
-                import shutil
                 shutil.rmtree(self.persist_dir)  # Clean up failed database
             raise
 
     def setup_documents(self, documents: List[Any]) -> None:
         """Set up documents for retrieval."""
         if not documents:
-            logging.error("No documents provided for RAG setup")
-            print("[DEBUG] ERROR: No documents provided for RAG setup")
+            log.error("No documents provided for RAG setup")
             raise ValueError("Documents list is empty")
             
-        logging.info(f"Processing {len(documents)} documents")
-        print(f"[DEBUG] setup_documents: Processing {len(documents)} documents")
-        
-        # Print document types for debugging
-        doc_types = [type(doc).__name__ for doc in documents]
-        print(f"[DEBUG] Document types: {doc_types}")
+        log.info("Processing %d documents", len(documents))
         
         # Split documents into chunks
-        print("[DEBUG] Splitting documents into chunks...")
         splits = self.split_documents(documents)
         
         if not splits:
-            logging.error("Document splitting resulted in empty chunks")
-            print("[DEBUG] ERROR: Document splitting resulted in empty chunks")
+            log.error("Document splitting resulted in empty chunks")
             raise ValueError("No text chunks generated from documents")
             
-        logging.info(f"Created {len(splits)} text chunks")
-        print(f"[DEBUG] Created {len(splits)} text chunks")
+        log.info("Created %d text chunks", len(splits))
         
-        # Create vector database
-        print("[DEBUG] Creating vector database...")
-        self.vectordb = self.create_vector_db(splits)
-        print(f"[DEBUG] Vector database created with {self.vectordb._collection.count()} documents")
+        # Key the database by the chunk contents and the embedding settings that produced
+        # the vectors; a changed model or dimension must not load incompatible vectors
+        digest = hashlib.sha256(f"{self.embeddings.model}:{self.embeddings.dimensions}".encode())
+        for split in splits:
+            digest.update(b"\0")
+            digest.update(split.page_content.encode())
+        self.persist_dir = str(Path(self.persist_base) / digest.hexdigest()[:16])
+        
+        # Create vector database, or load the one built earlier from the same contents
+        with _vector_db_lock(self.persist_dir):
+            self.vectordb = self.create_vector_db(splits)
+        # Contexts retrieved from a previous set of documents no longer apply
+        self._query_cache.clear()
 
     def get_context(self, query: str) -> str:
         """Get context from vector database using query."""
+        return self.get_contexts_bulk([query])[query]
+
+    def get_contexts_bulk(self, queries: List[str]) -> Dict[str, str]:
+        """Get contexts for several queries, embedding all of them in a single request."""
         # Get collection size and adjust k accordingly
-        collection_size = self.vectordb._collection.count()
+        collection_size = self._collection_size
         k = min(10, collection_size)
-        logging.info(f"Retrieving {k} documents from a collection of {collection_size} documents")
-        print(f"[DEBUG] get_context: Retrieving {k} documents from a collection of {collection_size} documents")
-        print(f"[DEBUG] Query: {query[:100]}..." if len(query) > 100 else f"[DEBUG] Query: {query}")
+        log.info("Retrieving %d documents per query for %d queries from a collection of %d documents", k, len(queries), collection_size)
+        
+        contexts = {}
+        missing = []
+        for query in dict.fromkeys(queries):
+            context = self._query_cache.get(query)
+            if context is None:
+                missing.append(query)
+            else:
+                # Move the hit to the end so eviction drops the least recently used entry
+                self._query_cache.move_to_end(query)
+                contexts[query] = context
+        if missing:
+            query_vectors = self.embeddings.embed_documents(missing)
+            for query, query_vector in zip(missing, query_vectors):
+                contexts[query] = self._retrieve_context(query, query_vector, k)
+        return contexts
+
+    def _retrieve_context(self, query: str, query_vector: List[float], k: int) -> str:
+        """Get the context for one embedded query from the vector database and cache it."""
+        log.debug("Query: %.100s", query)
         
-        retriever = self.vectordb.as_retriever(
-            search_type="similarity", 
-            search_kwargs={"k": k}
+        # Search the collection directly with the embedding we already have; only the chunk
+        # texts are needed, so skip fetching metadata and distances and building Documents
+        result = self.vectordb._collection.query(
+            query_embeddings=[query_vector],
+            n_results=k,
+            include=["documents"]
         )
-        docs = retriever.get_relevant_documents(query)
-        logging.info(f"Retrieved {len(docs)} relevant documents")
-        print(f"[DEBUG] Retrieved {len(docs)} relevant documents")
+        contents = result["documents"][0]
+        log.info("Retrieved %d relevant documents", len(contents))
         
-        # Print sample of retrieved documents
-        for i, doc in enumerate(docs[:3]):  # Print first 3 docs only
-            content = doc.page_content
-            sample = content[:100] + "..." if len(content) > 100 else content
-            print(f"[DEBUG] Retrieved doc {i+1} sample: {sample}")
-            
-        context = "".join(doc.page_content for doc in docs)
-        print(f"[DEBUG] Total context length: {len(context)} characters")
+        # Skip chunks retrieved more than once and stop at the prompt budget
+        seen = set()
+        parts = []
+        remaining = CONTEXT_MAX_CHARS
+        for content in contents:
+            if content in seen:
+                continue
+            seen.add(content)
+            parts.append(content[:remaining])
+            remaining -= len(content)
+            if remaining <= 0:
+                break
+        context = "\n\n".join(parts)
+        log.debug("Total context length: %d characters", len(context))
+        self._query_cache[query] = context
+        if len(self._query_cache) > QUERY_CACHE_SIZE:
+            self._query_cache.popitem(last=False)
         return context
 
     def ask_ai(self, prompt_key: str, context: str, **kwargs) -> str:
@@ -397,7 +510,7 @@ class RAGHandler:
             
         except Exception as e:
             error_msg = f"Error in ask_ai: {str(e)}"
-            logging.error(error_msg)
+            log.error(error_msg)
             raise RuntimeError(error_msg)
 
     def process_section(self, section_key: str, **kwargs) -> str:
@@ -449,51 +562,49 @@ class RAGHandler:
             
             # Extract and clean the response content
             services = response.choices[0].message.content.strip()
-            logging.info(f"Raw LLM response: {services}")
+            log.info("Raw LLM response: %s", services)
             
             # Clean and validate JSON
             cleaned_json = services.replace("```json", "").replace("```", "").strip()
             try:
                 json_services = json.loads(cleaned_json)
                 
-                # Strict format validation
-                if not isinstance(json_services, dict):
-                    raise ValueError("Response must be a JSON object")
-                if "services" not in json_services:
-                    raise ValueError("Response must have a 'services' key")
-                if not isinstance(json_services["services"], list):
-                    raise ValueError("'services' must be an array")
-                if not json_services["services"]:
-                    raise ValueError("'services' array cannot be empty")
-                if not all(isinstance(s, dict) and len(s) == 1 and "Name" in s and isinstance(s["Name"], str) for s in json_services["services"]):
-                    raise ValueError("Each service must be an object with exactly one 'Name' field containing a string")
+                # Strict format validation: a non-empty 'services' array of objects with
+                # exactly one string 'Name' field
+                try:
+                    ServiceList.model_validate(json_services)
+                except ValidationError as e:
+                    raise ValueError(f"Invalid services response: {e}")
                     
-                logging.info(f"Parsed services: {json_services}")
+                log.info("Parsed services: %s", json_services)
                 
                 # Create files directory if it doesn't exist
                 os.makedirs("files", exist_ok=True)
                 self.save_to_file("files/microservices.json", json_services)
+                self._services = json_services
                 return json_services
                 
             except json.JSONDecodeError as e:
-                logging.error(f"JSON parsing error: {e}")
-                logging.error(f"Attempted to parse: {cleaned_json}")
+                log.error("JSON parsing error: %s", e)
+                log.error("Attempted to parse: %s", cleaned_json)
                 raise ValueError(f"Failed to parse LLM response as JSON: {e}")
                 
         except Exception as e:
-            logging.error(f"Error in architecture diagram analysis: {e}")
+            log.error("Error in architecture diagram analysis: %s", e)
             raise
 
     def encode_image(self, image_path: str) -> str:
         """Encode image file to base64 string."""
-        if not os.path.exists(image_path):
+        try:
+            st = os.stat(image_path)
+        except FileNotFoundError:
             raise FileNotFoundError(f"Image file not found: {image_path}")
             
         try:
-            with open(image_path, "rb") as image_file:
-                return base64.b64encode(image_file.read()).decode("utf-8")
+            # Keyed on mtime and size so a re-uploaded diagram is encoded afresh
+            return _encode_image_file(image_path, st.st_mtime_ns, st.st_size)
         except Exception as e:
-            logging.error(f"Error encoding image {image_path}: {e}")
+            log.error("Error encoding image %s: %s", image_path, e)
             raise
 
     def rag_image(self, path: str) -> Dict[str, Any]:
@@ -505,13 +616,15 @@ class RAGHandler:
         """Save content to file with proper error handling."""
         try:
             os.makedirs(os.path.dirname(filepath), exist_ok=True)
-            with open(filepath, mode, encoding="utf-8") as f:
-                if isinstance(content, dict):
-                    json.dump(content, f, indent=4)
-                else:
+            if isinstance(content, dict):
+                # orjson serializes straight to UTF-8 bytes, several times faster than json.dump
+                with open(filepath, mode + "b") as f:
+                    f.write(orjson.dumps(content, option=orjson.OPT_INDENT_2))
+            else:
+                with open(filepath, mode, encoding="utf-8") as f:
                     f.write(f"{content}\n")
         except Exception as e:
-            logging.error(f"Error saving to file: {e}")
+            log.error("Error saving to file: %s", e)
             raise
 
     def append_to_file(self, content: str) -> None:
@@ -520,41 +633,88 @@ class RAGHandler:
 
     def rag_main(self, documents: List[Any]) -> str:
         """Main RAG process with optimized document processing."""
-        logging.info("Starting RAG main process")
-        print(f"[DEBUG] rag_main: Starting RAG process with {len(documents)} documents")
+        log.info("Starting RAG main process")
         
         # Setup documents for RAG
-        print("[DEBUG] Setting up documents for RAG...")
         self.setup_documents(documents)
         prompt = ""
         
-        # Cache the vector database size
-        collection_size = self.vectordb._collection.count()
+        # Vector database size, recorded when the database was created or loaded
+        collection_size = self._collection_size
         if collection_size == 0:
-            print("[DEBUG] ERROR: No documents were successfully processed and embedded")
             raise ValueError("No documents were successfully processed and embedded")
-        logging.info(f"Working with {collection_size} document chunks")
-        print(f"[DEBUG] Working with {collection_size} document chunks in vector database")
+        log.info("Working with %d document chunks", collection_size)
         
         # Process main sections with cached context
         sections = ["introduction", "functional_flows", "third_party_integrations"]
-        section_contexts = {}
-        section_results = {}
         
-        # First, get all contexts to avoid repeated retrievals
+        # Collect every section and service query up front so they are embedded in one request
+        section_queries = {}
         for section in sections:
             prompt_data = self.prompt_manager.get_prompt(section)
             if prompt_data.query:
-                section_contexts[section] = self.get_context(prompt_data.query)
+                section_queries[section] = prompt_data.query
+        
+        services_error = None
+        try:
+            # Use the services parsed in this handler; the file is only a fallback
+            services = self._services
+            if services is None:
+                with open("files/microservices.json", "rb") as f:
+                    services = orjson.loads(f.read())
+            service_names = [service["Name"] for service in services["services"]]
+        except Exception as e:
+            # Raised when the microservice summaries are processed, after the sections are saved
+            services_error = e
+            service_names = []
+        service_queries = {}
+        service_prompt = self.prompt_manager.get_prompt("microservice_summary")
+        if service_prompt.query:
+            for service in service_names:
+                service_queries[service] = service_prompt.query.format(service=service)
+        
+        contexts = self.get_contexts_bulk(list(section_queries.values()) + list(service_queries.values()))
+        section_contexts = {section: contexts[query] for section, query in section_queries.items()}
+        service_contexts = {service: contexts[query] for service, query in service_queries.items()}
+        
+        # The section and service LLM calls are independent, so run them all concurrently and
+        # consume the results below in the original order
+        with ThreadPoolExecutor(max_workers=ASK_AI_MAX_CONCURRENCY) as executor:
+            section_futures = {
+                section: executor.submit(self.ask_ai, section, section_contexts.get(section, ""))
+                for section in sections
+            }
+            service_futures = {
+                service: executor.submit(self.ask_ai, "microservice_summary", service_contexts.get(service, ""), service=service)
+                for service in service_names
+            }
+            prompt += self._collect_rag_results(sections, section_futures, services_error, service_names, service_futures)
+
+        log.info("RAG main process completed")
+        return prompt
+
+    def _collect_rag_results(self, sections, section_futures, services_error, service_names, service_futures) -> str:
+        """Write section and microservice results to the report in order and return the combined text."""
+        # Report lines are buffered and appended to outputreport.txt in one write at the end
+        report = []
+        try:
+            return self._collect_rag_report(report, sections, section_futures, services_error, service_names, service_futures)
+        finally:
+            if report:
+                self.append_to_file("\n".join(report))
+
+    def _collect_rag_report(self, report, sections, section_futures, services_error, service_names, service_futures) -> str:
+        """Buffer section and microservice results into `report` in order and return the combined text."""
+        prompt = ""
+        section_results = {}
         
-        # Then process each section using cached contexts
+        # Process each section using cached contexts
         for section in sections:
             section_header = f"\n# {section.replace('_', ' ').title()}\n"
-            self.append_to_file(section_header)
+            report.append(section_header)
             prompt += section_header
             
-            context = section_contexts.get(section, "")
-            result = self.ask_ai(section, context)
+            result = section_futures[section].result()
             # Store the result without the section header
             if section in ["functional_flows", "third_party_integrations"]:
                 # Remove any duplicate section headers that might be in the result
@@ -563,7 +723,7 @@ class RAGHandler:
                 section_results[section] = clean_result.strip()
             else:
                 section_results[section] = result
-            self.append_to_file(result)
+            report.append(result)
             prompt += result
 
         # Update additionalinfo.json with functional_flows and third_party_integrations
@@ -572,8 +732,8 @@ class RAGHandler:
             additional_info_path = os.path.join('storage', self.assessment_id, 'additionalinfo.json')
             
             if os.path.exists(additional_info_path):
-                with open(additional_info_path, 'r') as f:
-                    enhanced_info = json.load(f)
+                with open(additional_info_path, 'rb') as f:
+                    enhanced_info = orjson.loads(f.read())
             else:
                 enhanced_info = {
                 }
@@ -584,46 +744,35 @@ class RAGHandler:
             
             # Save updated info using storage handler
             os.makedirs(os.path.dirname(additional_info_path), exist_ok=True)
-            with open(additional_info_path, 'w') as f:
-                json.dump(enhanced_info, f, indent=2)
+            with open(additional_info_path, 'wb') as f:
+                f.write(orjson.dumps(enhanced_info, option=orjson.OPT_INDENT_2))
                 
-            logging.info(f"Successfully updated additionalinfo.json for assessment {self.assessment_id}")
+            log.info("Successfully updated additionalinfo.json for assessment %s", self.assessment_id)
             
         except Exception as e:
-            logging.error(f"Error updating additionalinfo.json for assessment {self.assessment_id}: {str(e)}")
+            log.error("Error updating additionalinfo.json for assessment %s: %s", self.assessment_id, e)
 
         # Process microservice summaries
         ms_header = "\n# Microservice Summaries\n"
-        self.append_to_file(ms_header)
+        report.append(ms_header)
         prompt += ms_header
 
         try:
-            with open("files/microservices.json", "r", encoding="utf-8") as f:
-                services = json.load(f)
-                service_names = [service["Name"] for service in services["services"]]
-
-                # Cache contexts for all services first
-                service_contexts = {}
-                for service in service_names:
-                    prompt_data = self.prompt_manager.get_prompt("microservice_summary")
-                    if prompt_data.query:
-                        query = prompt_data.query.format(service=service)
-                        service_contexts[service] = self.get_context(query)
-
-                # Then process each service using cached contexts
-                for service in service_names:
-                    service_header = f"\n## {service} Microservice\n"
-                    self.append_to_file(service_header)
-                    prompt += service_header
-                    
-                    context = service_contexts.get(service, "")
-                    result = self.ask_ai("microservice_summary", context, service=service)
-                    self.append_to_file(result)
-                    prompt += result
+            if services_error:
+                raise services_error
+                
+            # Process each service using the contexts retrieved above
+            for service in service_names:
+                service_header = f"\n## {service} Microservice\n"
+                report.append(service_header)
+                prompt += service_header
+                
+                result = service_futures[service].result()
+                report.append(result)
+                prompt += result
                     
         except Exception as e:
-            logging.error(f"Error processing microservices: {e}")
+            log.error("Error processing microservices: %s", e)
             raise
 
-        logging.info("RAG main process completed")
         return prompt
@@ -1,25 +1,118 @@
 import os
 import logging
 import json
+import functools
+import time
 import requests
-from dotenv import load_dotenv
+from dotenv import dotenv_values, load_dotenv
 
-# Load environment variables from .env file
+# Export .env to the process environment too, for libraries that read it directly
+# (the OpenAI SDK falls back to OPENAI_API_KEY there); existing variables win
 load_dotenv()
 
+def _load_env():
+    """Parse the .env file once and overlay the process environment, which takes precedence."""
+    return {**dotenv_values(), **os.environ}
+
+# Settings from the .env file and the environment, read by the getters below
+_ENV = _load_env()
+
+def _getenv(name, default=None):
+    # dotenv_values maps keys declared without a value to None; treat those as unset
+    value = _ENV.get(name)
+    return default if value is None else value
+
+@functools.lru_cache(maxsize=None)
 def get_llm_method():
-    return os.getenv('LLM_METHOD', 'OPENAI')  # Default to OPENAI if not specified
+    return _getenv('LLM_METHOD', 'OPENAI')  # Default to OPENAI if not specified
 
+@functools.lru_cache(maxsize=None)
 def get_openai_api_key():
-    return os.getenv('OPENAI_API_KEY')
+    return _getenv('OPENAI_API_KEY')
     
+@functools.lru_cache(maxsize=None)
 def get_bedrock_config():
     return {
-        'base_url': os.getenv('BEDROCK_BASE_URL'),
-        'api_key': os.getenv('BEDROCK_API_KEY'),
-        'model': os.getenv('BEDROCK_MODEL', 'claude-3.7-sonnet')  # Default model
+        'base_url': _getenv('BEDROCK_BASE_URL'),
+        'api_key': _getenv('BEDROCK_API_KEY'),
+        'model': _getenv('BEDROCK_MODEL', 'claude-3.7-sonnet')  # Default model
     }
 
+@functools.lru_cache(maxsize=None)
+def get_llm_rate_limits():
+    """
+    Get the optional LLM request and token budgets from environment variables.
+    
+    Returns:
+        Dictionary with 'rpm' (requests per minute) and 'tpm' (tokens per minute);
+        a value is None when the limit is not configured
+    """
+    rpm = _getenv('LLM_REQUESTS_PER_MINUTE')
+    tpm = _getenv('LLM_TOKENS_PER_MINUTE')
+    return {
+        'rpm': int(rpm) if rpm else None,
+        'tpm': int(tpm) if tpm else None
+    }
+
+@functools.lru_cache(maxsize=None)
+def get_threat_model_cache_ttl():
+    """
+    Get how long cached threat model responses stay valid.
+    
+    Returns:
+        TTL in seconds; 0 (the default) disables the threat model response cache, so
+        regenerating with the same inputs asks the LLM again
+    """
+    return int(_getenv('THREAT_MODEL_CACHE_TTL', '0'))
+
+@functools.lru_cache(maxsize=None)
+def get_semantic_cache_threshold():
+    """
+    Get the cosine similarity above which a near-duplicate threat model request
+    reuses an earlier response.
+    
+    Returns:
+        Similarity threshold; 0 disables the semantic cache
+    """
+    return float(_getenv('THREAT_MODEL_SEMANTIC_CACHE_THRESHOLD', '0'))
+
+@functools.lru_cache(maxsize=None)
+def get_embedding_config():
+    """
+    Get the embedding model and output size used for the RAG vector database.
+    
+    Returns:
+        Dictionary with 'model' and 'dimensions'; dimensions is None when the
+        model's native size should be used
+    """
+    dimensions = int(_getenv('EMBED_DIM', '1024'))
+    return {
+        'model': _getenv('EMBED_MODEL', 'text-embedding-3-large'),
+        'dimensions': dimensions or None
+    }
+
+@functools.lru_cache(maxsize=None)
+def get_report_gzip_level():
+    """
+    Get the gzip compression level for stored assessment reports.
+    
+    Returns:
+        Level from 1 to 9, or 0 to store reports as plain JSON
+    """
+    return max(0, min(9, int(_getenv('REPORT_GZIP_LEVEL', '0'))))
+
+@functools.lru_cache(maxsize=None)
+def get_verify_llm_connection():
+    """
+    Check whether LLM clients should verify connectivity with a models.list() call
+    when they are created.
+    
+    Returns:
+        True if THREATSHIELD_VERIFY_LLM is set to 1/true
+    """
+    return _getenv('THREATSHIELD_VERIFY_LLM', '0').lower() in ('1', 'true')
+
+@functools.lru_cache(maxsize=None)
 def get_confluence_credentials():
     """
     Get Confluence credentials from environment variables.
@@ -28,10 +121,11 @@ def get_confluence_credentials():
         Dictionary containing Confluence API key and username
     """
     return {
-        'api_key': os.getenv('CONFLUENCE_API_KEY', ''),
-        'username': os.getenv('CONFLUENCE_USERNAME', '')
+        'api_key': _getenv('CONFLUENCE_API_KEY', ''),
+        'username': _getenv('CONFLUENCE_USERNAME', '')
     }
 
+@functools.lru_cache(maxsize=None)
 def get_slack_credentials():
     """
     Get Slack credentials from environment variables.
@@ -40,9 +134,41 @@ def get_slack_credentials():
         Dictionary containing Slack token and other credentials
     """
     return {
-        'token': os.getenv('SLACK_API_TOKEN', '')
+        'token': _getenv('SLACK_API_TOKEN', '')
     }
 
+# Settings are read from the environment once per process: the getters above are memoized,
+# so the dictionaries they return are shared and must be treated as read-only
+_CACHED_GETTERS = (
+    get_llm_method,
+    get_openai_api_key,
+    get_bedrock_config,
+    get_llm_rate_limits,
+    get_threat_model_cache_ttl,
+    get_semantic_cache_threshold,
+    get_embedding_config,
+    get_report_gzip_level,
+    get_verify_llm_connection,
+    get_confluence_credentials,
+    get_slack_credentials,
+)
+
+# Seconds a successful Slack connection test is reused; failures are always retried
+CONNECTION_TEST_CACHE_TTL = 60
+# Slack token -> (expiry on the monotonic clock, test result)
+_slack_connection_cache = {}
+
+def reset_config_cache():
+    """
+    Forget memoized settings so the next getter call re-reads .env and the environment,
+    e.g. after os.environ has been changed at runtime.
+    """
+    global _ENV
+    _ENV = _load_env()
+    for getter in _CACHED_GETTERS:
+        getter.cache_clear()
+    _slack_connection_cache.clear()
+
 def test_confluence_connection(confluence_url):
     """
     Test if Confluence connection works with the provided URL and stored credentials.
@@ -83,9 +209,12 @@ def test_slack_connection(slack_url):
             logging.error("Slack token not found in .env file")
             return False, "Slack token not found in .env file"
         
-        # Log the token (first few chars only for security)
-        masked_token = token[:4] + "..." + token[-4:] if len(token) > 8 else "***"
-        logging.info(f"Testing Slack connection with token")
+        # A recent successful check for the same token is reused instead of calling auth.test again
+        cached = _slack_connection_cache.get(token)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        
+        logging.info("Testing Slack connection with token")
         
         # Check if the token is a path instead of an actual token
         if token.startswith('/'):
@@ -122,7 +251,9 @@ def test_slack_connection(slack_url):
         team_name = data.get('team', 'Unknown team')
         user_name = data.get('user', 'Unknown user')
         logging.info(f"Slack connection successful: Authenticated as {user_name} to team {team_name}")
-        return True, f"Slack connection successful: Authenticated as {user_name} to team {team_name}"
+        result = (True, f"Slack connection successful: Authenticated as {user_name} to team {team_name}")
+        _slack_connection_cache[token] = (time.monotonic() + CONNECTION_TEST_CACHE_TTL, result)
+        return result
         
     except Exception as e:
         logging.error(f"Error testing Slack connection: {str(e)}")
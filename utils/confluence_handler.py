@@ -1,75 +1,132 @@
 import logging
 import re
-import base64
 import requests
-import json
+import functools
+import orjson
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
 from urllib.parse import urlparse, parse_qs
-from langchain_community.document_loaders.confluence import ConfluenceLoader
-from langchain.schema import Document
+from langchain_core.documents import Document
 from utils.document_handler import process_pdf_file
 from utils.config import get_confluence_credentials
 
-def extract_page_info_from_url(confluence_url):
+log = logging.getLogger(__name__)
+
+# One pooled session per process so repeated Confluence API calls reuse warm
+# keep-alive connections instead of paying a TCP/TLS handshake per request
+_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=20, pool_maxsize=20)
+_session.mount('https://', _adapter)
+_session.mount('http://', _adapter)
+
+# Page contents fetched at once when loading a whole space
+CONFLUENCE_FETCH_CONCURRENCY = 16
+# Pages listed per request when paging through a space
+CONFLUENCE_PAGE_LIST_LIMIT = 100
+# Query string for fetching a page's body, shared by every page fetch
+_PAGE_BODY_PARAMS = {'expand': 'body.storage'}
+
+# Space key passed as a ?key= / &key= query parameter
+_SPACE_KEY_RE = re.compile(r'[?&]key=([^&]+)')
+
+ConfluenceUrlInfo = namedtuple('ConfluenceUrlInfo', ['page_id', 'space_key', 'base_url', 'content_api_url', 'is_cloud'])
+
+@functools.lru_cache(maxsize=1024)
+def _parse_confluence_url(confluence_url):
     """
-    Extract page ID and space key from Confluence URL.
+    Parse a Confluence URL once into everything the loaders need. Memoized, so a URL
+    processed repeatedly costs a dict lookup.
     
     Args:
         confluence_url: Confluence URL
         
     Returns:
-        Tuple of (page_id, space_key) or (None, None) if not found
+        ConfluenceUrlInfo with the page ID and space key (either may be None), the
+        base URL for REST API calls (ending in '/'), the content API endpoint built
+        from it, and whether it is Confluence Cloud
     """
-    try:
-        # Parse the URL
-        parsed_url = urlparse(confluence_url)
-        
-        # Try to extract from path
-        path_parts = parsed_url.path.strip('/').split('/')
-        
-        page_id = None
-        space_key = None
+    # Parse the URL
+    parsed_url = urlparse(confluence_url)
+    
+    # Try to extract from path
+    path_parts = parsed_url.path.strip('/').split('/')
+    
+    page_id = None
+    space_key = None
+    
+    # Pattern for wiki URLs: /wiki/spaces/SPACEKEY/pages/PAGEID/...
+    if len(path_parts) >= 4 and path_parts[0].lower() == 'wiki' and path_parts[1].lower() == 'spaces' and 'pages' in path_parts:
+        space_key = path_parts[2]
+        # The page ID is usually right after 'pages'
+        pages_index = path_parts.index('pages')
+        if pages_index + 1 < len(path_parts):
+            page_id = path_parts[pages_index + 1]
+    
+    # Try other common Confluence URL patterns for space key
+    # Pattern 1: /display/SPACEKEY/
+    elif len(path_parts) >= 2 and path_parts[0].lower() == 'display':
+        space_key = path_parts[1]
         
-        # Pattern for wiki URLs: /wiki/spaces/SPACEKEY/pages/PAGEID/...
-        if len(path_parts) >= 5 and path_parts[0].lower() == 'wiki' and path_parts[1].lower() == 'spaces' and 'pages' in path_parts:
-            space_key = path_parts[2]
-            # The page ID is usually right after 'pages'
-            pages_index = path_parts.index('pages')
-            if pages_index + 1 < len(path_parts):
-                page_id = path_parts[pages_index + 1]
-                logging.info(f"Extracted page ID: {page_id} and space key: {space_key} from URL")
-                return page_id, space_key
+    # Pattern 2: /spaces/SPACEKEY/
+    elif len(path_parts) >= 2 and path_parts[0].lower() == 'spaces':
+        space_key = path_parts[1]
         
-        # Try other common Confluence URL patterns for space key
-        # Pattern 1: /display/SPACEKEY/
-        if len(path_parts) >= 2 and path_parts[0].lower() == 'display':
-            space_key = path_parts[1]
-            
-        # Pattern 2: /spaces/SPACEKEY/
-        elif len(path_parts) >= 2 and path_parts[0].lower() == 'spaces':
-            space_key = path_parts[1]
+    # Try to extract from query parameters
+    if not space_key:
+        query_params = parse_qs(parsed_url.query)
+        if 'spaceKey' in query_params:
+            space_key = query_params['spaceKey'][0]
             
-        # Try to extract from query parameters
-        if not space_key:
-            query_params = parse_qs(parsed_url.query)
-            if 'spaceKey' in query_params:
-                space_key = query_params['spaceKey'][0]
-                
-        # Try to find space key in the URL using regex
-        if not space_key:
-            space_key_match = re.search(r'[?&]key=([^&]+)', confluence_url)
-            if space_key_match:
-                space_key = space_key_match.group(1)
+    # Try to find space key in the URL using regex
+    if not space_key:
+        space_key_match = _SPACE_KEY_RE.search(confluence_url)
+        if space_key_match:
+            space_key = space_key_match.group(1)
+    
+    # Get the scheme (http/https) and netloc (domain)
+    base_domain = f"{parsed_url.scheme}://{parsed_url.netloc}"
+    
+    # For Atlassian Confluence Cloud URLs
+    is_cloud = 'atlassian.net' in base_domain
+    if is_cloud:
+        # The API endpoints are relative to the domain
+        base_url = base_domain
+    else:
+        # For self-hosted Confluence, might need to include /wiki in the base URL
+        # This is a simplification and might need adjustment for specific setups
+        base_url = confluence_url.split('/wiki')[0]
+    if not base_url.endswith('/'):
+        base_url += '/'
         
-        if not page_id:
-            logging.warning(f"Could not extract page ID from URL: {confluence_url}")
-        if not space_key:
-            logging.warning(f"Could not extract space key from URL: {confluence_url}")
-            
-        return page_id, space_key
+    return ConfluenceUrlInfo(page_id, space_key, base_url, f"{base_url}wiki/rest/api/content", is_cloud)
+
+def extract_page_info_from_url(confluence_url):
+    """
+    Extract page ID and space key from Confluence URL.
+    
+    Args:
+        confluence_url: Confluence URL
         
+    Returns:
+        Tuple of (page_id, space_key) or (None, None) if not found
+    """
+    try:
+        info = _parse_confluence_url(confluence_url)
     except Exception as e:
-        logging.error(f"Error extracting info from URL: {str(e)}")
+        log.error("Error extracting info from URL: %s", e)
         return None, None
+        
+    if info.page_id:
+        log.info("Extracted page ID: %s and space key: %s from URL", info.page_id, info.space_key)
+        return info.page_id, info.space_key
+    
+    log.warning("Could not extract page ID from URL: %s", confluence_url)
+    if not info.space_key:
+        log.warning("Could not extract space key from URL: %s", confluence_url)
+        
+    return info.page_id, info.space_key
 
 def extract_space_key_from_url(confluence_url):
     """
@@ -82,40 +139,91 @@ def extract_space_key_from_url(confluence_url):
         Space key extracted from URL or None if not found
     """
     try:
-        # Parse the URL
-        parsed_url = urlparse(confluence_url)
+        space_key = _parse_confluence_url(confluence_url).space_key
+    except Exception as e:
+        log.error("Error extracting space key from URL: %s", e)
+        return None
         
-        # Try to extract from path
-        path_parts = parsed_url.path.strip('/').split('/')
+    if not space_key:
+        log.warning("Could not extract space key from URL: %s", confluence_url)
+    return space_key
+
+def _iter_space_pages(content_api_url, auth, space_key):
+    """
+    Yield the pages of a space, requesting the listing one page of results at a time.
+    
+    Raises:
+        ValueError: If a listing request fails
+    """
+    # Make direct API calls to get pages
+    start = 0
+    while True:
+        params = {
+            'spaceKey': space_key,
+            'start': start,
+            'limit': CONFLUENCE_PAGE_LIST_LIMIT,
+            'expand': 'version'  # Just get minimal info, not content
+        }
         
-        # Common Confluence URL patterns
-        # Pattern 1: /display/SPACEKEY/
-        if len(path_parts) >= 2 and path_parts[0].lower() == 'display':
-            return path_parts[1]
-            
-        # Pattern 2: /spaces/SPACEKEY/
-        if len(path_parts) >= 2 and path_parts[0].lower() == 'spaces':
-            return path_parts[1]
-            
-        # Pattern 3: /wiki/spaces/SPACEKEY/pages/...
-        if len(path_parts) >= 4 and path_parts[0].lower() == 'wiki' and path_parts[1].lower() == 'spaces' and 'pages' in path_parts:
-            return path_parts[2]
-            
-        # Try to extract from query parameters
-        query_params = parse_qs(parsed_url.query)
-        if 'spaceKey' in query_params:
-            return query_params['spaceKey'][0]
+        response = _session.get(content_api_url, auth=auth, params=params)
+        
+        if not response.ok:
+            error_msg = f"Failed to fetch pages: HTTP {response.status_code} - {response.text}"
+            log.error(error_msg)
+            raise ValueError(error_msg)
             
-        # Try to find space key in the URL using regex
-        space_key_match = re.search(r'[?&]key=([^&]+)', confluence_url)
-        if space_key_match:
-            return space_key_match.group(1)
+        pages_data = orjson.loads(response.content)
+        results = pages_data.get('results') or []
+        yield from results
+        
+        # Confluence only links a next page of results when there is one
+        if not results or 'next' not in pages_data.get('_links', {}):
+            return
+        start += len(results)
+
+def _fetch_space_page(base_url, content_api_url, auth, space_key, page):
+    """
+    Fetch the content of one page listed in a space.
+    
+    Returns:
+        Document for the page, or None if its content could not be fetched
+    """
+    page_id = page['id']
+    page_title = page.get('title', 'Untitled')
+    
+    try:
+        # Get the content. The body is streamed straight from the socket into the parser
+        # and only the storage value is kept, so the raw bytes and the rest of the
+        # response graph are freed (and the connection returned) before the Document is built
+        with _session.get(f"{content_api_url}/{page_id}", auth=auth, params=_PAGE_BODY_PARAMS, stream=True) as content_response:
+            if not content_response.ok:
+                log.warning("Failed to fetch content for page %s: HTTP %s", page_title, content_response.status_code)
+                return None
+            storage = orjson.loads(content_response.raw.read(decode_content=True)).get('body', {}).get('storage')
+        
+        # Extract the content
+        if storage:
+            content = storage['value']
             
-        logging.warning(f"Could not extract space key from URL: {confluence_url}")
-        return None
+            # Create a document object
+            doc = Document(
+                page_content=content,
+                metadata={
+                    'title': page_title,
+                    'id': page_id,
+                    'url': f"{base_url}wiki/spaces/{space_key}/pages/{page_id}",
+                    'source': 'confluence'
+                }
+            )
+            log.info("Loaded document: %s", page_title)
+            return doc
         
+        log.warning("Could not extract content from page %s", page_title)
+        return None
+            
     except Exception as e:
-        logging.error(f"Error extracting space key from URL: {str(e)}")
+        # If we can't get content for a specific page, log and continue
+        log.warning("Failed to process page %s: %s", page_title, e)
         return None
 
 def load_confluence_documents(confluence_url):
@@ -128,70 +236,47 @@ def load_confluence_documents(confluence_url):
         # Validate credentials
         if not api_key or not username:
             error_msg = "Confluence credentials not found. Please check your .env file."
-            logging.error(error_msg)
+            log.error(error_msg)
             raise ValueError(error_msg)
         
-        # Extract page ID and space key from URL
-        page_id, space_key = extract_page_info_from_url(confluence_url)
+        # Parse the URL once for the page ID, space key and API base URL
+        url_info = _parse_confluence_url(confluence_url)
+        page_id, space_key, base_url = url_info.page_id, url_info.space_key, url_info.base_url
         
-        logging.info(f"Using Confluence URL: {confluence_url}")
+        log.info("Using Confluence URL: %s", confluence_url)
         if page_id:
-            logging.info(f"Targeting specific page ID: {page_id}")
+            log.info("Targeting specific page ID: %s", page_id)
         if space_key:
-            logging.info(f"Using space key: {space_key}")
-        
-        # Extract the base domain for API calls
-        parsed_url = urlparse(confluence_url)
-        
-        # Get the scheme (http/https) and netloc (domain)
-        base_domain = f"{parsed_url.scheme}://{parsed_url.netloc}"
+            log.info("Using space key: %s", space_key)
         
-        # For Atlassian Confluence Cloud URLs
-        if 'atlassian.net' in base_domain:
-            # The API endpoints are relative to the domain
-            base_url = base_domain
-            if not base_url.endswith('/'):
-                base_url += '/'
-            logging.info(f"Using Atlassian Cloud base URL: {base_url}")
+        if url_info.is_cloud:
+            log.info("Using Atlassian Cloud base URL: %s", base_url)
         else:
-            # For self-hosted Confluence, might need to include /wiki in the base URL
-            # This is a simplification and might need adjustment for specific setups
-            base_url = confluence_url
-            if '/wiki' in base_url:
-                base_url = base_url.split('/wiki')[0]
-            if not base_url.endswith('/'):
-                base_url += '/'
-            logging.info(f"Using self-hosted Confluence base URL: {base_url}")
+            log.info("Using self-hosted Confluence base URL: %s", base_url)
             
-        # Create auth header using Basic Authentication
-        auth_str = f"{username}:{api_key}"
-        auth_bytes = auth_str.encode('ascii')
-        base64_auth = base64.b64encode(auth_bytes).decode('ascii')
-        headers = {
-            'Authorization': f'Basic {base64_auth}',
-            'Content-Type': 'application/json'
-        }
+        # Basic Authentication, applied by requests; GET requests carry no body, so no Content-Type
+        auth = HTTPBasicAuth(username, api_key)
         
         try:
             # Step 1: Get list of pages without expand parameter
-            logging.info(f"Fetching page list from space: {space_key}")
+            log.info("Fetching page list from space: %s", space_key)
             
             documents = []
             
             # If we have a specific page ID, fetch just that page
             if page_id:
-                logging.info(f"Fetching specific page with ID: {page_id}")
+                log.info("Fetching specific page with ID: %s", page_id)
                 
                 # Make direct API call to get the page with content
-                content_url = f"{base_url}wiki/rest/api/content/{page_id}?expand=body.storage,version"
-                content_response = requests.get(content_url, headers=headers)
+                content_url = f"{url_info.content_api_url}/{page_id}"
+                content_response = _session.get(content_url, auth=auth, params={'expand': 'body.storage,version'})
                 
                 if not content_response.ok:
                     error_msg = f"Failed to fetch page with ID {page_id}: HTTP {content_response.status_code} - {content_response.text}"
-                    logging.error(error_msg)
+                    log.error(error_msg)
                     raise ValueError(error_msg)
                     
-                page_data = content_response.json()
+                page_data = orjson.loads(content_response.content)
                 page_title = page_data.get('title', 'Untitled')
                 
                 # Extract the content
@@ -209,96 +294,45 @@ def load_confluence_documents(confluence_url):
                         }
                     )
                     documents.append(doc)
-                    logging.info(f"Loaded document: {page_title}")
+                    log.info("Loaded document: %s", page_title)
                 else:
                     error_msg = f"Could not extract content from page with ID {page_id}"
-                    logging.warning(error_msg)
+                    log.warning(error_msg)
                     raise ValueError(error_msg)
                     
             # If we don't have a page ID but have a space key, fetch all pages in the space
             elif space_key:
-                logging.info(f"No specific page ID found. Fetching all pages from space: {space_key}")
-                
-                # Make direct API call to get pages
-                pages_url = f"{base_url}wiki/rest/api/content"
-                params = {
-                    'spaceKey': space_key,
-                    'limit': 1500,
-                    'expand': 'version'  # Just get minimal info, not content
-                }
+                log.info("No specific page ID found. Fetching all pages from space: %s", space_key)
                 
-                response = requests.get(pages_url, headers=headers, params=params)
-                
-                if not response.ok:
-                    error_msg = f"Failed to fetch pages: HTTP {response.status_code} - {response.text}"
-                    logging.error(error_msg)
-                    raise ValueError(error_msg)
+                # Fetch page contents concurrently while later pages of the listing are still
+                # being requested; futures are collected in listing order
+                fetch_page = functools.partial(_fetch_space_page, base_url, url_info.content_api_url, auth, space_key)
+                with ThreadPoolExecutor(max_workers=CONFLUENCE_FETCH_CONCURRENCY) as executor:
+                    futures = [executor.submit(fetch_page, page) for page in _iter_space_pages(url_info.content_api_url, auth, space_key)]
                     
-                pages_data = response.json()
-                
-                if 'results' not in pages_data or not pages_data['results']:
-                    error_msg = "No pages found in the specified Confluence space"
-                    logging.warning(error_msg)
-                    raise ValueError(error_msg)
-                    
-                pages = pages_data['results']
-                logging.info(f"Found {len(pages)} pages in space {space_key}")
-                
-                # Fetch content for each page individually
-                for page in pages:
-                    page_id = page['id']
-                    page_title = page.get('title', 'Untitled')
+                    if not futures:
+                        error_msg = "No pages found in the specified Confluence space"
+                        log.warning(error_msg)
+                        raise ValueError(error_msg)
+                    log.info("Found %d pages in space %s", len(futures), space_key)
                     
-                    try:
-                        # Get the content
-                        content_url = f"{base_url}wiki/rest/api/content/{page_id}?expand=body.storage"
-                        content_response = requests.get(content_url, headers=headers)
-                        
-                        if not content_response.ok:
-                            logging.warning(f"Failed to fetch content for page {page_title}: HTTP {content_response.status_code}")
-                            continue
-                            
-                        content_data = content_response.json()
-                        
-                        # Extract the content
-                        if 'body' in content_data and 'storage' in content_data['body']:
-                            content = content_data['body']['storage']['value']
-                            
-                            # Create a document object
-                            doc = Document(
-                                page_content=content,
-                                metadata={
-                                    'title': page_title,
-                                    'id': page_id,
-                                    'url': f"{base_url}wiki/spaces/{space_key}/pages/{page_id}",
-                                    'source': 'confluence'
-                                }
-                            )
-                            documents.append(doc)
-                            logging.info(f"Loaded document: {page_title}")
-                        else:
-                            logging.warning(f"Could not extract content from page {page_title}")
-                            
-                    except Exception as e:
-                        # If we can't get content for a specific page, log and continue
-                        logging.warning(f"Failed to process page {page_title}: {str(e)}")
-                        continue
+                    documents.extend(doc for doc in (future.result() for future in futures) if doc is not None)
             else:
                 error_msg = "Could not extract page ID or space key from URL. Please check the URL format."
-                logging.error(error_msg)
+                log.error(error_msg)
                 raise ValueError(error_msg)
             
             if not documents:
                 error_msg = "Could not extract content from any pages in the space"
-                logging.warning(error_msg)
+                log.warning(error_msg)
                 raise ValueError(error_msg)
                 
-            logging.info(f"Successfully loaded {len(documents)} documents from Confluence")
+            log.info("Successfully loaded %d documents from Confluence", len(documents))
             return documents
             
         except Exception as e:
             error_msg = f"Failed to connect to Confluence: {str(e)}"
-            logging.error(error_msg)
+            log.error(error_msg)
             raise ValueError(error_msg)
         
     except ValueError as e:
@@ -306,43 +340,39 @@ def load_confluence_documents(confluence_url):
         raise
     except Exception as e:
         error_msg = f"Error loading Confluence documents: {str(e)}"
-        logging.error(error_msg)
+        log.error(error_msg)
         raise ValueError(error_msg)
 
 def decide_document_source(confluence_url, api_key=None, username=None, space_key=None, file_paths=None):
     try:
-        print(f"[DEBUG] decide_document_source received file_paths: {file_paths}")
-        logging.info(f"decide_document_source received file_paths: {file_paths}")
+        log.info("decide_document_source received file_paths: %s", file_paths)
         
         if confluence_url:
             documents = load_confluence_documents(confluence_url)
         elif file_paths:
             # Handle single file path or list of file paths
             if isinstance(file_paths, list):
-                print(f"[DEBUG] Processing multiple PDF files: {len(file_paths)} files")
-                logging.info(f"Processing multiple PDF files: {len(file_paths)} files")
+                log.info("Processing multiple PDF files: %d files", len(file_paths))
                 documents = []
                 for file_path in file_paths:
-                    print(f"[DEBUG] Processing PDF file: {file_path}")
                     file_documents = process_pdf_file(file_path)
-                    print(f"[DEBUG] Extracted {len(file_documents)} documents from {file_path}")
+                    log.debug("Extracted %d documents from %s", len(file_documents), file_path)
                     documents.extend(file_documents)
-                print(f"[DEBUG] Total documents extracted from all PDFs: {len(documents)}")
+                log.debug("Total documents extracted from all PDFs: %d", len(documents))
             else:
-                print(f"[DEBUG] Processing single PDF file: {file_paths}")
                 documents = process_pdf_file(file_paths)
-                print(f"[DEBUG] Extracted {len(documents)} documents from single PDF")
+                log.debug("Extracted %d documents from single PDF", len(documents))
         else:
-            logging.error("No valid document source provided")
+            log.error("No valid document source provided")
             raise ValueError("No document source provided (neither Confluence credentials nor PDF file)")
             
         if not documents:
-            logging.error("No documents were loaded from any source")
+            log.error("No documents were loaded from any source")
             raise ValueError("No documents were loaded from the provided source")
             
-        logging.info(f"Successfully loaded {len(documents)} documents")
+        log.info("Successfully loaded %d documents", len(documents))
         return documents
         
     except Exception as e:
-        logging.error(f"Error in decide_document_source: {str(e)}")
+        log.error("Error in decide_document_source: %s", e)
         raise
\ No newline at end of file
@@ -1,46 +1,47 @@
-from langchain.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
 import logging
 import os
 
+log = logging.getLogger(__name__)
+
 
 def process_pdf_file(file_path):
-    logging.info(f"Processing PDF file: {file_path}")
-    print(f"[DEBUG] process_pdf_file: Processing {file_path}")
+    log.info("Processing PDF file: %s", file_path)
     
     try:
         # Verify file exists and has content
         if not os.path.exists(file_path):
-            print(f"[DEBUG] ERROR: File does not exist: {file_path}")
             raise FileNotFoundError(f"File does not exist: {file_path}")
             
         file_size = os.path.getsize(file_path)
-        print(f"[DEBUG] File size: {file_size} bytes")
+        log.debug("File size: %d bytes", file_size)
         
         if file_size == 0:
-            print(f"[DEBUG] WARNING: File is empty: {file_path}")
-            logging.warning(f"File is empty: {file_path}")
-        
-        # Use PyPDFLoader with the saved file path
-        loader = PyPDFLoader(file_path)
-        pages = loader.load()
+            log.warning("File is empty: %s", file_path)
         
-        print(f"[DEBUG] Extracted {len(pages)} pages from {file_path}")
+        # Extract text with PDFium (C++), much faster than pure-Python pypdf; one Document
+        # per page with the same metadata PyPDFLoader produced. PDFium is not thread-safe,
+        # so pages are extracted sequentially
+        # Imported here so modules that never parse a PDF don't load the PDFium bindings
+        import pypdfium2 as pdfium
+        pdf = pdfium.PdfDocument(file_path)
+        try:
+            pages = []
+            for i in range(len(pdf)):
+                page = pdf[i]
+                textpage = page.get_textpage()
+                try:
+                    text = textpage.get_text_range()
+                finally:
+                    textpage.close()
+                    page.close()
+                pages.append(Document(page_content=text, metadata={'source': file_path, 'page': i}))
+        finally:
+            pdf.close()
         
-        # Print content from each page for debugging
-        for i, page in enumerate(pages):
-            content_length = len(page.page_content)
-            logging.info(f"Page {i+1} content length: {content_length}")
-            print(f"[DEBUG] Page {i+1} content length: {content_length}")
-            
-            # Print sample of content for verification
-            if content_length > 0:
-                sample = page.page_content[:100] + "..." if content_length > 100 else page.page_content
-                print(f"[DEBUG] Page {i+1} content sample: {sample}")
-            else:
-                print(f"[DEBUG] WARNING: Page {i+1} is empty")
+        log.debug("Extracted %d pages from %s", len(pages), file_path)
             
         return pages
     except Exception as e:
-        print(f"[DEBUG] Error processing PDF file: {str(e)}")
-        logging.error(f"Error processing PDF file: {str(e)}")
+        log.error("Error processing PDF file: %s", e)
         raise
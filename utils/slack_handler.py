@@ -1,10 +1,23 @@
 import logging
-import re
 import json
+import functools
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse, parse_qs
 import requests
+from requests.adapters import HTTPAdapter
 from utils.config import get_slack_credentials
 
+# One pooled session per process so repeated Slack API calls reuse warm
+# keep-alive connections instead of paying a TCP/TLS handshake per request
+_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=20, pool_maxsize=20)
+_session.mount('https://', _adapter)
+_session.mount('http://', _adapter)
+
+# users.info lookups in flight at once when resolving a thread's authors
+SLACK_USER_LOOKUP_CONCURRENCY = 8
+
 def extract_channel_thread_from_url(slack_url):
     """
     Extract channel ID and thread timestamp from Slack URL.
@@ -28,11 +41,10 @@ def extract_channel_thread_from_url(slack_url):
             
             # Thread timestamp is in the format p1234567890123456
             # We need to convert it to 1234567890.123456
-            thread_ts_match = re.match(r'p(\d{10})(\d{6})', path_parts[2])
-            if thread_ts_match:
-                seconds = thread_ts_match.group(1)
-                microseconds = thread_ts_match.group(2)
-                thread_ts = f"{seconds}.{microseconds}"
+            # The segment is fixed-width, so slice it rather than running a regex
+            segment = path_parts[2]
+            if len(segment) >= 17 and segment[0] == 'p' and segment[1:17].isdigit():
+                thread_ts = f"{segment[1:11]}.{segment[11:17]}"
                 return channel_id, thread_ts
         
         logging.warning(f"Could not extract channel and thread from URL: {slack_url}")
@@ -42,6 +54,33 @@ def extract_channel_thread_from_url(slack_url):
         logging.error(f"Error extracting channel and thread from URL: {str(e)}")
         return None, None
 
+@functools.lru_cache(maxsize=10000)
+def _lookup_user_name(token, user):
+    """
+    Get the real name of a Slack user. Successful lookups are cached per token,
+    so authors seen in earlier threads are not looked up again.
+    
+    Raises:
+        LookupError: If the user could not be resolved (not cached, so it is retried)
+    """
+    user_response = _session.get(
+        'https://slack.com/api/users.info',
+        headers={'Authorization': f'Bearer {token}'},
+        params={'user': user}
+    )
+    
+    user_data = orjson.loads(user_response.content)
+    if user_data.get('ok') and user_data.get('user'):
+        return user_data['user'].get('real_name', user)
+    raise LookupError(f"Could not resolve Slack user {user}: {user_data.get('error', 'Unknown error')}")
+
+def _resolve_user_name(token, user):
+    """Get the real name of a Slack user, falling back to the user ID if it cannot be resolved."""
+    try:
+        return _lookup_user_name(token, user)
+    except LookupError:
+        return user
+
 def load_slack_thread(slack_url):
     """
     Load messages from a Slack thread.
@@ -74,23 +113,21 @@ def load_slack_thread(slack_url):
         
         # Call Slack API to get thread messages
         try:
+            # Only GET requests are made here, so no Content-Type header
             headers = {
-                'Authorization': f'Bearer {token}',
-                'Content-Type': 'application/json'
+                'Authorization': f'Bearer {token}'
             }
             
-            # Log the token (first few chars only for security)
-            if token:
-                masked_token = token[:4] + "..." + token[-4:] if len(token) > 8 else "***"
-                logging.info(f"Using Slack token: {masked_token}")
-            else:
-                logging.warning("Slack token is empty")
+            # Log the token (first few chars only for security); only masked when INFO is logged
+            if logging.root.isEnabledFor(logging.INFO):
+                masked_token = f"{token[:4]}...{token[-4:]}" if len(token) > 8 else "***"
+                logging.info("Using Slack token: %s", masked_token)
                 
             # Log request details
             logging.info(f"Making Slack API request to conversations.replies for channel: {channel_id}, thread: {thread_ts}")
             
             # Get thread messages
-            response = requests.get(
+            response = _session.get(
                 'https://slack.com/api/conversations.replies',
                 headers=headers,
                 params={
@@ -109,7 +146,7 @@ def load_slack_thread(slack_url):
                 logging.error(f"Response content: {response.text[:500]}")  # Log first 500 chars of response
                 raise ValueError(error_msg)
                 
-            data = response.json()
+            data = orjson.loads(response.content)
             
             # Log response data (excluding sensitive info)
             logging.info(f"Slack API response: ok={data.get('ok')}, error={data.get('error', 'None')}")
@@ -130,39 +167,28 @@ def load_slack_thread(slack_url):
                 raise ValueError(error_msg)
             
             # Get channel info for metadata
-            channel_response = requests.get(
+            channel_response = _session.get(
                 'https://slack.com/api/conversations.info',
                 headers=headers,
                 params={'channel': channel_id}
             )
             
-            channel_data = channel_response.json()
+            channel_data = orjson.loads(channel_response.content)
             channel_name = "Unknown Channel"
             
             if channel_data.get('ok') and channel_data.get('channel'):
                 channel_name = channel_data['channel'].get('name', "Unknown Channel")
             
-            # Format messages into a readable string
-            formatted_content = ""
-            for msg in messages:
-                user = msg.get('user', 'Unknown User')
-                text = msg.get('text', '')
-                ts = msg.get('ts', '')
-                
-                # Try to get user info
-                user_response = requests.get(
-                    'https://slack.com/api/users.info',
-                    headers=headers,
-                    params={'user': user}
-                )
-                
-                user_data = user_response.json()
-                if user_data.get('ok') and user_data.get('user'):
-                    user_name = user_data['user'].get('real_name', user)
-                else:
-                    user_name = user
-                
-                formatted_content += f"{user_name}: {text}\n\n"
+            # Resolve each distinct author once rather than once per message, concurrently
+            users = list({msg.get('user', 'Unknown User') for msg in messages})
+            with ThreadPoolExecutor(max_workers=max(1, min(SLACK_USER_LOOKUP_CONCURRENCY, len(users)))) as executor:
+                user_names = dict(zip(users, executor.map(functools.partial(_resolve_user_name, token), users)))
+            
+            # Format messages into a readable string, separated by blank lines, in one join
+            formatted_content = "\n\n".join([
+                f"{user_names[msg.get('user', 'Unknown User')]}: {msg.get('text', '')}"
+                for msg in messages
+            ])
             
             result = {
                 "url": slack_url,
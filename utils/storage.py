@@ -1,238 +1,683 @@
-import json
+import copy
+import gzip
+import heapq
+import mmap
 import os
-import uuid
-from datetime import datetime
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+import orjson
 from langchain_core.messages import HumanMessage, AIMessage
+from utils.config import get_report_gzip_level
+
+# Parsed details.json files, keyed by (path, mtime, size) and kept in LRU order
+_DETAILS_CACHE = OrderedDict()
+_DETAILS_CACHE_SIZE = 256
+_details_cache_lock = threading.Lock()
+
+def _read_json_mmap(path, size):
+    """Parse a JSON file through a read-only memory map, avoiding an intermediate bytes copy."""
+    if size == 0:
+        return orjson.loads(b"")  # raises JSONDecodeError, as for any empty document
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        with memoryview(mm) as view:
+            return orjson.loads(view)
+
+def load_details(assessment_id, base_dir='storage'):
+    """
+    Load details.json for an assessment. The parsed result is reused until the file's
+    modification time or size changes, so callers must treat the returned dict as read-only.
+    Raises FileNotFoundError if the assessment has no details.json.
+    """
+    path = os.path.join(base_dir, assessment_id, 'details.json')
+    st = os.stat(path)
+    key = (path, st.st_mtime_ns, st.st_size)
+    with _details_cache_lock:
+        details = _DETAILS_CACHE.get(key)
+        if details is not None:
+            _DETAILS_CACHE.move_to_end(key)
+            return details
+    
+    details = _read_json_mmap(path, st.st_size)
+    with _details_cache_lock:
+        _DETAILS_CACHE[key] = details
+        if len(_DETAILS_CACHE) > _DETAILS_CACHE_SIZE:
+            _DETAILS_CACHE.popitem(last=False)
+    return details
+
+# Report files shown in the assessment list, in the order their metadata is consulted
+_REPORT_TYPES = {
+    'rag_result.json': 'rag_result',
+    'threat_model.json': 'threat_model',
+    'dread_assessment.json': 'dread_assessment',
+    'mitigation.json': 'mitigation',
+    'attack_tree.json': 'attack_tree',
+    'test_cases.json': 'test_cases',
+    'chat_history.json': 'chat_history',  # legacy, rewritten whole on every save
+    'chat_history.jsonl': 'chat_history',  # one message per line, appended to
+    'prompts.json': 'prompts'
+}
+
+# Thread pool for reading report files while listing assessments, created on first use
+# and shared by every StorageHandler
+_LIST_MAX_WORKERS = 16
+_list_executor = None
+_list_executor_lock = threading.Lock()
+
+# Parsed report files, keyed by path, stored with the (mtime, size) they were read at and
+# kept in LRU order. Entries are shared, so they must never be modified; the total is
+# bounded by the size of the JSON they were parsed from
+_REPORT_CACHE = OrderedDict()
+_REPORT_CACHE_SIZE = 1024
+_REPORT_CACHE_MAX_BYTES = 256 << 20
+_REPORT_CACHE_MAX_ENTRY_BYTES = 16 << 20
+_report_cache_bytes = 0
+_report_cache_lock = threading.Lock()
+
+# Suffix of report files stored gzip-compressed; readers accept either form
+_GZIP_SUFFIX = '.gz'
+
+# Role recorded for each chat message type; an exact type lookup is cheaper than isinstance
+_ROLE_MAP = {HumanMessage: "user", AIMessage: "assistant"}
+
+# Per-assessment summary written next to the reports, so the assessment list can be
+# built without parsing every report body
+_META_FILENAME = 'meta.json'
+_meta_lock = threading.Lock()
+
+# Serializes chat log writes, so a legacy history is migrated exactly once
+_chat_log_lock = threading.Lock()
+
+# Append-only list of assessment IDs in the base directory, so listing doesn't have to
+# walk it; IDs whose directory has since been deleted are dropped when listing finds them
+_INDEX_FILENAME = '_index.jsonl'
+_index_lock = threading.Lock()
+
+def _get_list_executor():
+    global _list_executor
+    with _list_executor_lock:
+        if _list_executor is None:
+            _list_executor = ThreadPoolExecutor(max_workers=_LIST_MAX_WORKERS, thread_name_prefix='storage-list')
+        return _list_executor
+
+def _format_time_ns(time_ns):
+    """Format nanoseconds since the epoch as a UTC ISO 8601 string with microseconds."""
+    seconds, nanoseconds = divmod(time_ns, 1_000_000_000)
+    return f"{time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(seconds))}.{nanoseconds // 1000:06d}"
+
+# Per-thread buffer that report files are read into, so repeated listings don't allocate
+# a new bytes object per file; files larger than the cap are read the usual way so no
+# thread holds on to a huge buffer
+_READ_BUFFER_MIN = 1 << 20
+_READ_BUFFER_MAX = 16 << 20
+_read_buffers = threading.local()
+
+def _read_chat_log(filepath):
+    """
+    Read an append-only chat log into the {"timestamp", "result"} shape of the other reports,
+    stamped with the time of the last append. Returns None if the log is missing.
+    """
+    try:
+        with open(filepath, 'rb') as f:
+            mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+            messages = []
+            for line in f:
+                try:
+                    messages.append(orjson.loads(line))
+                except orjson.JSONDecodeError:
+                    # Blank or torn trailing line from an interrupted append
+                    continue
+    except FileNotFoundError:
+        return None
+    return {"timestamp": _format_time_ns(mtime_ns), "result": messages}
+
+def _read_report(filepath):
+    """Read and parse one report file, or return None if it is missing or not valid JSON."""
+    if filepath.endswith('.jsonl'):
+        return _read_chat_log(filepath)
+    try:
+        # One unbuffered read of the whole file into this thread's reusable buffer
+        with open(filepath, 'rb', buffering=0) as f:
+            size = os.fstat(f.fileno()).st_size
+            if size > _READ_BUFFER_MAX:
+                raw = f.readall()
+            else:
+                buf = getattr(_read_buffers, 'buf', None)
+                if buf is None or len(buf) < size:
+                    buf = _read_buffers.buf = bytearray(max(size, _READ_BUFFER_MIN))
+                view = memoryview(buf)
+                raw = view[:f.readinto(view[:size])]
+        if filepath.endswith(_GZIP_SUFFIX):
+            raw = gzip.decompress(raw)
+        return orjson.loads(raw)
+    except (orjson.JSONDecodeError, FileNotFoundError, gzip.BadGzipFile, EOFError):
+        return None
+
+def _read_report_bytes(filepath):
+    """Read a report file's JSON bytes, decompressing gzip reports; None if missing or corrupt."""
+    try:
+        with open(filepath, 'rb', buffering=0) as f:
+            raw = f.readall()
+        if filepath.endswith(_GZIP_SUFFIX):
+            raw = gzip.decompress(raw)
+        return raw
+    except (FileNotFoundError, gzip.BadGzipFile, EOFError):
+        return None
+
+def _evict_cached_report(filepath):
+    """Drop one entry from the report cache; callers hold _report_cache_lock."""
+    global _report_cache_bytes
+    entry = _REPORT_CACHE.pop(filepath, None)
+    if entry is not None:
+        _report_cache_bytes -= entry[2]
+
+def _load_cached_report(filepath):
+    """
+    Read and parse a report, reusing the parsed result until the file's modification
+    time or size changes. The result is shared, so callers must treat it as read-only.
+    """
+    global _report_cache_bytes
+    if filepath.endswith('.jsonl'):
+        return _read_chat_log(filepath)
+    try:
+        st = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    version = (st.st_mtime_ns, st.st_size)
+    with _report_cache_lock:
+        entry = _REPORT_CACHE.get(filepath)
+        if entry is not None and entry[0] == version:
+            _REPORT_CACHE.move_to_end(filepath)
+            return entry[1]
+    raw = _read_report_bytes(filepath)
+    if raw is None:
+        return None
+    try:
+        data = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return None
+    if len(raw) <= _REPORT_CACHE_MAX_ENTRY_BYTES:
+        with _report_cache_lock:
+            _evict_cached_report(filepath)
+            _REPORT_CACHE[filepath] = (version, data, len(raw))
+            _report_cache_bytes += len(raw)
+            while len(_REPORT_CACHE) > _REPORT_CACHE_SIZE or _report_cache_bytes > _REPORT_CACHE_MAX_BYTES:
+                _evict_cached_report(next(iter(_REPORT_CACHE)))
+    return data
+
+def _read_stored_report(filepath):
+    """Read a report saved either compressed or as plain JSON."""
+    data = _read_report(filepath + _GZIP_SUFFIX)
+    return data if data is not None else _read_report(filepath)
+
+def _write_atomic(path, payload):
+    """Write bytes to `path` via a temporary file and rename, so readers never see a partial file."""
+    # Unique per writing thread, so concurrent saves of the same file don't share a temp file
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
 
 class StorageHandler:
+    # Report name -> file it is stored in, for every report retrievable by name
+    _REPORTS = {
+        **{report_type: filename for filename, report_type in _REPORT_TYPES.items()},
+        'chat_history': 'chat_history.jsonl',
+        'additionalinfo': 'additionalinfo.json'
+    }
+    
     def __init__(self, base_dir='storage'):
         self.base_dir = base_dir
+        # Paths are built by plain concatenation onto this prefix; os.path.join is
+        # comparatively slow and these paths are built for every listed report
+        self._prefix = os.path.join(base_dir, '')
         os.makedirs(base_dir, exist_ok=True)
         
-    def save_prompts(self, assessment_id, prompts_data):
-        """Save prompts used for generating threat model, attack tree, mitigations, and DREAD."""
-        data = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "prompts": prompts_data
-        }
-        self._save_json(assessment_id, 'prompts.json', data)
+    def _path(self, assessment_id, filename):
+        return f"{self._prefix}{assessment_id}{os.sep}{filename}"
         
-    def get_prompts(self, assessment_id):
-        """Get prompts used for generating threat model, attack tree, mitigations, and DREAD."""
-        return self._load_json(assessment_id, 'prompts.json')
+    @staticmethod
+    def _now_iso():
+        """Current UTC time as an ISO 8601 string with microseconds, the format every report is stamped with."""
+        return _format_time_ns(time.time_ns())
         
     def create_assessment(self):
         """Create a new assessment directory and return its ID."""
-        assessment_id = str(uuid.uuid4())
+        # 128 random bits like a UUID4, without the formatting; IDs are opaque directory names
+        assessment_id = secrets.token_hex(16)
         assessment_dir = os.path.join(self.base_dir, assessment_id)
         os.makedirs(assessment_dir, exist_ok=True)
+        self._add_to_index(assessment_id)
         return assessment_id
+        
+    def _index_entry(self, assessment_id):
+        return orjson.dumps({"id": assessment_id, "created": self._now_iso()}) + b"\n"
+        
+    def _read_index(self):
+        """Return the index lines keyed by assessment ID, or None if there is no index yet."""
+        try:
+            with open(f"{self._prefix}{_INDEX_FILENAME}", 'rb') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return None
+        entries = {}
+        for line in lines:
+            try:
+                entries.setdefault(orjson.loads(line)['id'], line)
+            except (orjson.JSONDecodeError, KeyError, TypeError):
+                # Torn trailing line from an interrupted append
+                continue
+        return entries
+        
+    def _seed_index(self):
+        """Write an index of every assessment directory; callers hold _index_lock."""
+        # scandir reports the entry type without a separate stat per entry
+        with os.scandir(self.base_dir) as base_entries:
+            entries = {entry.name: self._index_entry(entry.name) for entry in base_entries if entry.is_dir()}
+        _write_atomic(f"{self._prefix}{_INDEX_FILENAME}", b"".join(entries.values()))
+        return entries
+        
+    def _add_to_index(self, assessment_id):
+        with _index_lock:
+            entries = self._read_index()
+            if entries is None:
+                # First write since the index was introduced: record every existing assessment
+                entries = self._seed_index()
+            if assessment_id not in entries:
+                with open(f"{self._prefix}{_INDEX_FILENAME}", 'ab') as f:
+                    f.write(self._index_entry(assessment_id))
+                    
+    def _list_assessment_ids(self):
+        entries = self._read_index()
+        if entries is None:
+            with _index_lock:
+                entries = self._read_index() or self._seed_index()
+        return list(entries)
+        
+    def _drop_from_index(self, assessment_ids):
+        with _index_lock:
+            entries = self._read_index()
+            if entries is None:
+                return
+            _write_atomic(
+                f"{self._prefix}{_INDEX_FILENAME}",
+                b"".join(line for assessment_id, line in entries.items() if assessment_id not in assessment_ids)
+            )
     
-    def retrive_from_storage(self, assessment_id=None, assessment_name=None):
-        """Retrieve specific results from the assessment or list all assessments"""
+    def retrive_from_storage(self, assessment_id=None, assessment_name=None, include_bodies=False, limit=None):
+        """
+        Retrieve specific results from the assessment or list all assessments.
+        When listing, include_bodies selects the report bodies inlined into each entry:
+        False for none, True for all, or a collection of report types; limit keeps only
+        the most recent assessments.
+        """
         if assessment_id:
             # Return specific assessment data
-            if assessment_name == 'rag_result':
-                return self.get_rag_result(assessment_id)
-            elif assessment_name == 'threat_model':
-                return self.get_threat_model(assessment_id)
-            elif assessment_name == 'dread_assessment':
-                return self.get_dread_assessment(assessment_id)
-            elif assessment_name == 'mitigation':
-                return self.get_mitigation_result(assessment_id)
-            elif assessment_name == 'attack_tree':
-                return self.get_attack_tree(assessment_id)
-            elif assessment_name == 'test_cases':
-                return self.get_test_cases(assessment_id)
-            elif assessment_name == 'chat_history':
-                return self.get_chat_history(assessment_id)
-            elif assessment_name == 'prompts':
-                return self.get_prompts(assessment_id)
-            elif assessment_name == 'additionalinfo':
-                return self.get_additional_info(assessment_id)
-            else:
-                raise ValueError(f"Unknown name: {assessment_name}")
+            return self.get(assessment_id, assessment_name)
         else:
             # Return list of all assessments with their metadata
-            return self._list_all_assessments()
+            return self._list_all_assessments(include_bodies, limit)
+            
+    def get_report(self, assessment_id, report_type):
+        """Load the full body of one report, e.g. after listing assessment summaries."""
+        return self.get(assessment_id, report_type)
             
-    def _list_all_assessments(self):
-        """List all assessments and their available reports"""
+    def _list_all_assessments(self, include_bodies=False, limit=None):
+        """
+        List all assessments with their name, timestamp and available report types,
+        read from meta.json, plus the report bodies selected by include_bodies.
+        Newest first; with a limit, only the `limit` most recent are returned.
+        """
         assessments = []
         
         # Check if base directory exists
         if not os.path.exists(self.base_dir):
             return assessments
             
-        # Iterate through all assessment directories
-        for assessment_id in os.listdir(self.base_dir):
-            assessment_dir = os.path.join(self.base_dir, assessment_id)
-            
-            # Skip if not a directory
-            if not os.path.isdir(assessment_dir):
+        assessment_ids = self._list_assessment_ids()
+        
+        deleted = set()
+        for assessment_id in assessment_ids:
+            meta = _read_report(self._path(assessment_id, _META_FILENAME))
+            if meta is None:
+                # Assessments saved before meta.json existed get one built from their reports
+                meta = self._rebuild_meta(assessment_id)
+            if meta is None:
+                deleted.add(assessment_id)
                 continue
-                
-            # Get available report types
-            available_reports = {}
-            report_types = {
-                'rag_result.json': 'rag_result',
-                'threat_model.json': 'threat_model',
-                'dread_assessment.json': 'dread_assessment',
-                'mitigation.json': 'mitigation',
-                'attack_tree.json': 'attack_tree',
-                'test_cases.json': 'test_cases',
-                'chat_history.json': 'chat_history',
-                'prompts.json': 'prompts'
-            }
-            
-            # Get timestamp from any available report
-            timestamp = None
-            name = None
-            
-            # Check which reports exist and get metadata
-            for filename, report_type in report_types.items():
-                filepath = os.path.join(assessment_dir, filename)
-                if os.path.exists(filepath):
-                    try:
-                        with open(filepath, 'r') as f:
-                            data = json.load(f)
-                            available_reports[report_type] = data  # Store full report data
-                            
-                            # If we don't have timestamp yet, get it from this report
-                            if timestamp is None:
-                                timestamp = data.get('timestamp')
-                            
-                            # Try to get a name from threat model if available
-                            if report_type == 'threat_model' and 'result' in data:
-                                result = data['result']
-                                if isinstance(result, dict) and 'name' in result:
-                                    name = result['name']
-                    except (json.JSONDecodeError, FileNotFoundError):
-                        pass
-            
-            # Only add if we found at least one report
-            if available_reports:
-                assessments.append({
-                    'id': assessment_id,
-                    'name': name or f"Assessment {assessment_id[:8]}",
-                    'timestamp': timestamp or datetime.utcnow().isoformat(),
-                    **available_reports
-                })
-                
-        # Sort by timestamp, newest first
-        assessments.sort(key=lambda x: x['timestamp'], reverse=True)
+            # Only assessments with at least one report are listed
+            if not meta.get('available'):
+                continue
+            assessments.append({
+                'id': assessment_id,
+                'name': meta.get('name') or f"Assessment {assessment_id[:8]}",
+                'timestamp': meta.get('timestamp') or self._now_iso(),
+                'available_reports': meta['available']
+            })
+        
+        if deleted:
+            self._drop_from_index(deleted)
+        
+        # Drop cached reports of assessments under this base directory that no longer exist
+        prefix = self._prefix
+        with _report_cache_lock:
+            for filepath in [path for path in _REPORT_CACHE
+                             if path.startswith(prefix) and path[len(prefix):].split(os.sep, 1)[0] in deleted]:
+                _evict_cached_report(filepath)
+        
+        # Sort by timestamp, newest first; a limit only needs a partial sort, and is applied
+        # before any report bodies are read
+        if limit:
+            assessments = heapq.nlargest(limit, assessments, key=itemgetter('timestamp'))
+        else:
+            assessments.sort(key=itemgetter('timestamp'), reverse=True)
+        
+        if include_bodies:
+            wanted = None if include_bodies is True else set(include_bodies)
+            bodies = self._load_report_bodies(
+                [(a['id'], t) for a in assessments for t in a['available_reports'] if wanted is None or t in wanted]
+            )
+            for assessment in assessments:
+                assessment.update(bodies.get(assessment['id'], {}))
         return assessments
         
-    def save_rag_result(self, assessment_id, rag_result):
-        """Save RAG processing results."""
-        data = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "result": rag_result
-        }
-        self._save_json(assessment_id, 'rag_result.json', data)
+    def _load_report_bodies(self, reports):
+        """Load (assessment_id, report_type) pairs into {assessment_id: {report_type: data}}."""
+        # Locate each report file, listing each directory once instead of probing each
+        # report file with a separate exists check
+        wanted = {}
+        for assessment_id, report_type in reports:
+            wanted.setdefault(assessment_id, set()).add(report_type)
+        tasks = []
+        for assessment_id, report_types in wanted.items():
+            try:
+                with os.scandir(f"{self._prefix}{assessment_id}") as entries:
+                    present = {entry.name: entry for entry in entries if entry.name.removesuffix(_GZIP_SUFFIX) in _REPORT_TYPES}
+                for filename, report_type in _REPORT_TYPES.items():
+                    if report_type not in report_types:
+                        continue
+                    entry = present.get(filename + _GZIP_SUFFIX) or present.get(filename)
+                    if entry is not None and entry.is_file():
+                        tasks.append((assessment_id, report_type, entry.path))
+            except FileNotFoundError:
+                continue
         
-    def save_threat_model(self, assessment_id, threat_model_result):
-        """Save threat model results."""
-        data = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "result": threat_model_result
-        }
-        self._save_json(assessment_id, 'threat_model.json', data)
+        # Reports are only re-read when their modification time or size has changed; the
+        # listing is only serialized, so it can share the cached objects without copying.
+        # The reads are I/O-bound, so overlap them on the shared pool; map() keeps task order
+        results = _get_list_executor().map(_load_cached_report, [filepath for _, _, filepath in tasks])
         
-    def save_dread_assessment(self, assessment_id, dread_result):
-        """Save DREAD assessment results."""
-        data = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "result": dread_result
-        }
-        self._save_json(assessment_id, 'dread_assessment.json', data)
+        # Fold the results per assessment, in report type order
+        bodies = {}
+        for (assessment_id, report_type, _), data in zip(tasks, results):
+            if data is not None:
+                bodies.setdefault(assessment_id, {})[report_type] = data  # Store full report data
+        return bodies
+        
+    def save(self, assessment_id, name, result):
+        """Save a report's result, stamped with the current time."""
+        self._save_json(assessment_id, self._filename(name), {
+            "timestamp": self._now_iso(),
+            "result": result
+        })
+        
+    def get(self, assessment_id, name):
+        """
+        Get a saved report, or None if it hasn't been generated yet. Each call returns
+        its own copy, so callers may modify it.
+        """
+        return self._load_json(assessment_id, self._filename(name))
+        
+    def _filename(self, name):
+        try:
+            return self._REPORTS[name]
+        except KeyError:
+            raise ValueError(f"Unknown name: {name}")
+        
+    def save_rag_result(self, assessment_id, rag_result):
+        """Save RAG processing results."""
+        self.save(assessment_id, 'rag_result', rag_result)
         
     def get_rag_result(self, assessment_id):
         """Get RAG processing results."""
-        return self._load_json(assessment_id, 'rag_result.json')
+        return self.get(assessment_id, 'rag_result')
+        
+    def save_threat_model(self, assessment_id, threat_model_result):
+        """Save threat model results."""
+        self.save(assessment_id, 'threat_model', threat_model_result)
         
     def get_threat_model(self, assessment_id):
         """Get threat model results."""
-        return self._load_json(assessment_id, 'threat_model.json')
+        return self.get(assessment_id, 'threat_model')
+        
+    def save_dread_assessment(self, assessment_id, dread_result):
+        """Save DREAD assessment results."""
+        self.save(assessment_id, 'dread_assessment', dread_result)
         
     def get_dread_assessment(self, assessment_id):
         """Get DREAD assessment results."""
-        return self._load_json(assessment_id, 'dread_assessment.json')
+        return self.get(assessment_id, 'dread_assessment')
         
     def save_mitigation_result(self, assessment_id, mitigation_result):
         """Save mitigation results."""
-        data = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "result": mitigation_result
-        }
-        self._save_json(assessment_id, 'mitigation.json', data)
+        self.save(assessment_id, 'mitigation', mitigation_result)
         
     def get_mitigation_result(self, assessment_id):
         """Get mitigation results."""
-        return self._load_json(assessment_id, 'mitigation.json')
+        return self.get(assessment_id, 'mitigation')
         
     def save_attack_tree(self, assessment_id, attack_tree_result):
         """Save attack tree results."""
-        data = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "result": attack_tree_result
-        }
-        self._save_json(assessment_id, 'attack_tree.json', data)
+        self.save(assessment_id, 'attack_tree', attack_tree_result)
         
     def get_attack_tree(self, assessment_id):
         """Get attack tree results."""
-        return self._load_json(assessment_id, 'attack_tree.json')
+        return self.get(assessment_id, 'attack_tree')
         
     def save_test_cases(self, assessment_id, test_cases_result):
         """Save test cases results."""
-        data = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "result": test_cases_result
-        }
-        self._save_json(assessment_id, 'test_cases.json', data)
+        self.save(assessment_id, 'test_cases', test_cases_result)
         
     def get_test_cases(self, assessment_id):
         """Get test cases results."""
-        return self._load_json(assessment_id, 'test_cases.json')
+        return self.get(assessment_id, 'test_cases')
+
+    @staticmethod
+    def _encode_chat_messages(messages):
+        return b"".join(
+            orjson.dumps({"role": _ROLE_MAP.get(type(msg), "assistant"), "content": msg.content}) + b"\n"
+            for msg in messages
+        )
 
     def save_chat_history(self, assessment_id, messages):
-        """Save chat history."""
-        data = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "result": [
-                {"role": "user" if isinstance(msg, HumanMessage) else "assistant", "content": msg.content}
-                for msg in messages
-            ]
-        }
-        self._save_json(assessment_id, 'chat_history.json', data)
+        """Save the whole chat history, replacing any previous one."""
+        filepath = self._path(assessment_id, self._filename('chat_history'))
+        with _chat_log_lock:
+            _write_atomic(filepath, self._encode_chat_messages(messages))
+            self._remove_legacy_chat_history(assessment_id)
+        self._chat_history_saved(assessment_id, filepath)
+
+    def append_chat_messages(self, assessment_id, new_messages):
+        """Append messages to the chat history without rewriting what is already stored."""
+        if not new_messages:
+            return
+        filepath = self._path(assessment_id, self._filename('chat_history'))
+        payload = self._encode_chat_messages(new_messages)
+        with _chat_log_lock:
+            if os.path.exists(filepath):
+                # One write per batch, so appends never interleave within a line
+                with open(filepath, 'ab') as f:
+                    f.write(payload)
+            else:
+                # First append: carry over a history saved in the legacy single-document
+                # format, which the log would otherwise hide from readers
+                legacy = self._load_json(assessment_id, 'chat_history.json')
+                if legacy and isinstance(legacy.get('result'), list):
+                    payload = b"".join(orjson.dumps(message) + b"\n" for message in legacy['result']) + payload
+                _write_atomic(filepath, payload)
+                self._remove_legacy_chat_history(assessment_id)
+        self._chat_history_saved(assessment_id, filepath)
+
+    def _remove_legacy_chat_history(self, assessment_id):
+        legacy_path = self._path(assessment_id, 'chat_history.json')
+        for path in (legacy_path, legacy_path + _GZIP_SUFFIX):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            with _report_cache_lock:
+                _evict_cached_report(path)
+
+    def _chat_history_saved(self, assessment_id, filepath):
+        with _report_cache_lock:
+            _evict_cached_report(filepath)
+        self._update_meta(assessment_id, 'chat_history', {"timestamp": self._now_iso()})
 
     def get_chat_history(self, assessment_id):
         """Get chat history."""
-        return self._load_json(assessment_id, 'chat_history.json')
+        return self.get(assessment_id, 'chat_history')
         
     def save_additional_info(self, assessment_id, additional_info):
         """Save additional info including functional flows and third party integrations."""
-        data = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "result": additional_info
-        }
-        self._save_json(assessment_id, 'additionalinfo.json', data)
+        self.save(assessment_id, 'additionalinfo', additional_info)
         
     def get_additional_info(self, assessment_id):
         """Get additional info including functional flows and third party integrations."""
-        return self._load_json(assessment_id, 'additionalinfo.json')
+        return self.get(assessment_id, 'additionalinfo')
+        
+    def save_prompts(self, assessment_id, prompts_data):
+        """Save prompts used for generating threat model, attack tree, mitigations, and DREAD."""
+        # prompts.json keeps its own top-level key rather than "result"
+        self._save_json(assessment_id, self._filename('prompts'), {
+            "timestamp": self._now_iso(),
+            "prompts": prompts_data
+        })
+        
+    def get_prompts(self, assessment_id):
+        """Get prompts used for generating threat model, attack tree, mitigations, and DREAD."""
+        return self.get(assessment_id, 'prompts')
         
     def _save_json(self, assessment_id, filename, data):
         """Helper method to save JSON data."""
-        filepath = os.path.join(self.base_dir, assessment_id, filename)
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2)
+        filepath = self._path(assessment_id, filename)
+        report_type = _REPORT_TYPES.get(filename)
+        # Compact output: the files are only read back by the API, never edited by hand
+        payload = orjson.dumps(data)
+        gzip_level = get_report_gzip_level() if report_type is not None else 0
+        if gzip_level:
+            # mtime=0 keeps the output identical for identical reports
+            written, stale = filepath + _GZIP_SUFFIX, filepath
+            payload = gzip.compress(payload, compresslevel=gzip_level, mtime=0)
+        else:
+            written, stale = filepath, filepath + _GZIP_SUFFIX
+        _write_atomic(written, payload)
+        # Only one form of a report may exist, or readers could pick up an outdated copy
+        try:
+            os.remove(stale)
+        except FileNotFoundError:
+            pass
+        # Don't rely on the mtime alone to invalidate the listing cache; it may be coarse
+        with _report_cache_lock:
+            _evict_cached_report(filepath)
+            _evict_cached_report(filepath + _GZIP_SUFFIX)
+        if report_type is not None:
+            self._update_meta(assessment_id, report_type, data)
             
-    def _load_json(self, assessment_id, filename):
-        """Helper method to load JSON data."""
+    @staticmethod
+    def _apply_report_to_meta(meta, report_type, data):
+        """Record one report's timestamp (and the threat model's name) in an assessment summary."""
+        meta['timestamps'][report_type] = data.get('timestamp')
+        if report_type == 'threat_model':
+            result = data.get('result')
+            if isinstance(result, dict) and 'name' in result:
+                meta['name'] = result['name']
+        StorageHandler._refresh_meta(meta)
+        
+    @staticmethod
+    def _refresh_meta(meta):
+        # In report type order, the first report with a timestamp dates the assessment
+        meta['available'] = [t for t in dict.fromkeys(_REPORT_TYPES.values()) if t in meta['timestamps']]
+        meta['timestamp'] = next((meta['timestamps'][t] for t in meta['available'] if meta['timestamps'][t]), None)
+        
+    def _update_meta(self, assessment_id, report_type, data):
+        """Fold a freshly saved report into the assessment's meta.json."""
+        meta_path = self._path(assessment_id, _META_FILENAME)
+        with _meta_lock:
+            meta = _read_report(meta_path)
+            first_report = meta is None
+            if first_report:
+                meta = self._build_meta(assessment_id)
+            else:
+                self._apply_report_to_meta(meta, report_type, data)
+            _write_atomic(meta_path, orjson.dumps(meta))
+        if first_report:
+            # Assessment directories can also be created outside create_assessment
+            self._add_to_index(assessment_id)
+                
+    def _build_meta(self, assessment_id):
+        """
+        Build an assessment summary from the reports on disk, reading only the threat model
+        (for the name) and the reports up to the first one with a timestamp.
+        Returns None if the assessment directory doesn't exist.
+        """
+        meta = {'timestamp': None, 'available': [], 'name': None, 'timestamps': {}}
         try:
-            filepath = os.path.join(self.base_dir, assessment_id, filename)
-            with open(filepath, 'r') as f:
-                return json.load(f)
+            with os.scandir(f"{self._prefix}{assessment_id}") as entries:
+                present = {entry.name.removesuffix(_GZIP_SUFFIX) for entry in entries}
         except FileNotFoundError:
             return None
+        for filename, report_type in _REPORT_TYPES.items():
+            if filename not in present:
+                continue
+            if meta['timestamp'] is None or report_type == 'threat_model':
+                data = _read_stored_report(self._path(assessment_id, filename))
+                if isinstance(data, dict):
+                    self._apply_report_to_meta(meta, report_type, data)
+            else:
+                # Later reports can't change the timestamp, so they are only marked available;
+                # their own timestamp is filled in when they are next saved
+                meta['timestamps'].setdefault(report_type, None)
+        self._refresh_meta(meta)
+        return meta
+        
+    def _rebuild_meta(self, assessment_id):
+        """Build and persist meta.json for an assessment that has none; returns None if it vanished."""
+        meta_path = self._path(assessment_id, _META_FILENAME)
+        with _meta_lock:
+            meta = self._build_meta(assessment_id)
+            if meta is not None and meta['available']:
+                try:
+                    _write_atomic(meta_path, orjson.dumps(meta))
+                except FileNotFoundError:
+                    return None
+        return meta
+            
+    def _load_json(self, assessment_id, filename):
+        """
+        Helper method to load JSON data. Parsed files are reused until they change on disk;
+        the caller gets its own deep copy.
+        """
+        filepath = self._path(assessment_id, filename)
+        if filename.endswith('.jsonl'):
+            # Histories saved before the log format existed are plain JSON
+            candidates = (filepath, filepath[:-1] + _GZIP_SUFFIX, filepath[:-1])
+        elif filename in _REPORT_TYPES:
+            candidates = (filepath + _GZIP_SUFFIX, filepath)
+        else:
+            candidates = (filepath,)
+        for candidate in candidates:
+            data = _load_cached_report(candidate)
+            if data is not None:
+                # Chat logs are parsed afresh on every read, so need no copy
+                return data if candidate.endswith('.jsonl') else copy.deepcopy(data)
+        return None